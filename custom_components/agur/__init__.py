@@ -1,12 +1,20 @@
 import logging
+from datetime import timedelta
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.storage import Store
 
 from .const import DOMAIN, STARTUP_MESSAGE, CONF_USERNAME, CONF_PASSWORD, PLATFORMS, CONF_CONTRACT_IDS, \
-    CONF_IMPORT_STATISTICS
+    CONF_IMPORT_STATISTICS, CONF_MAX_CONCURRENT_CONTRACTS, DEFAULT_MAX_CONCURRENT_CONTRACTS, DATA_TOKEN_MANAGERS, CONF_MIN_UPDATE_INTERVAL, \
+    DEFAULT_MIN_UPDATE_INTERVAL, CONF_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL, STORAGE_VERSION, \
+    snapshot_storage_key, backfill_storage_key
+from .analytics import AgurConsumptionAnalytics
 from .coordinator import AgurDataUpdateCoordinator
+from .history import AgurHistory
+from .scheduler import async_get_fleet_scheduler
+from .token_manager import async_get_token_manager
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
@@ -26,22 +34,50 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> b
     password: str = config_entry.data.get(CONF_PASSWORD)
     contract_ids: list[str] = config_entry.options.get(CONF_CONTRACT_IDS)
     import_statistics: bool = config_entry.options.get(CONF_IMPORT_STATISTICS)
+    max_concurrent_contracts: int = config_entry.options.get(
+        CONF_MAX_CONCURRENT_CONTRACTS,
+        DEFAULT_MAX_CONCURRENT_CONTRACTS
+    )
+    # Intervals are stored in hours in the options
+    min_update_interval = timedelta(hours=config_entry.options.get(
+        CONF_MIN_UPDATE_INTERVAL,
+        DEFAULT_MIN_UPDATE_INTERVAL.total_seconds() / 3600
+    ))
+    max_update_interval = timedelta(hours=config_entry.options.get(
+        CONF_MAX_UPDATE_INTERVAL,
+        DEFAULT_MAX_UPDATE_INTERVAL.total_seconds() / 3600
+    ))
 
     coordinator = AgurDataUpdateCoordinator(
         hass=hass,
         username=username,
         password=password,
         contract_ids=contract_ids,
-        import_statistics=import_statistics
+        import_statistics=import_statistics,
+        max_concurrent_contracts=max_concurrent_contracts,
+        min_update_interval=min_update_interval,
+        max_update_interval=max_update_interval
     )
-    await coordinator.async_config_entry_first_refresh()
-
-    if not coordinator.last_update_success:
-        raise ConfigEntryNotReady
+    if await coordinator.async_restore_snapshot():
+        # The entities are set up right away from the data saved by the last run, while it is refreshed in background
+        config_entry.async_create_background_task(
+            hass,
+            coordinator.async_background_refresh(),
+            f"{DOMAIN} refresh {username}"
+        )
+    else:
+        await coordinator.async_config_entry_first_refresh()
+
+        if not coordinator.last_update_success:
+            raise ConfigEntryNotReady
 
     hass.data[DOMAIN][config_entry.entry_id] = coordinator
+    # Spread the refreshes of all the accounts, which share a single rate limit on the Agur API
+    async_get_fleet_scheduler(hass).register(coordinator)
 
     await hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS)
+    # The statistics imported for the first time are imported once the setup is done, in the background
+    coordinator.backfill.start(config_entry)
 
     config_entry.add_update_listener(async_reload_entry)
     return True
@@ -51,10 +87,25 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
     unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unloaded:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        async_get_fleet_scheduler(hass).unregister(coordinator)
+        coordinator.backfill.cancel()
     return unloaded
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the data stored on disk for an entry."""
+    token_manager = async_get_token_manager(hass, entry.data.get(CONF_USERNAME), entry.data.get(CONF_PASSWORD))
+    await token_manager.async_remove()
+    hass.data[DOMAIN][DATA_TOKEN_MANAGERS].pop(token_manager.username)
+    await Store(hass, STORAGE_VERSION, snapshot_storage_key(entry.data.get(CONF_USERNAME))).async_remove()
+    await Store(hass, STORAGE_VERSION, backfill_storage_key(entry.data.get(CONF_USERNAME))).async_remove()
+
+    for contract_id in entry.options.get(CONF_CONTRACT_IDS, []):
+        await AgurHistory(hass, contract_id).async_remove()
+        await AgurConsumptionAnalytics(hass, contract_id).async_remove()
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
     await async_unload_entry(hass, entry)
@@ -1,70 +1,229 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import logging
+import operator
+import random
+import time
 import uuid
+from collections.abc import AsyncIterator, Callable, Mapping
+from contextlib import aclosing
 from datetime import datetime
-from typing import Any
+from functools import lru_cache
+from typing import Any, TypeVar
 
-from requests import post, get
+from aiohttp import ClientError, ClientResponseError, ClientSession, ClientTimeout
 
+from .metrics import AgurMetrics
 
-class AgurContract:
-    id: str | None = None
-    owner: str | None = None
-    address: str | None = None
-    meter_id: str | None = None
-    meter_serial_number: str | None = None
-    meter_endpoint_number: str | None = None
+try:
+    # Shipped with Home Assistant, and much faster than the standard library
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
-    def __init__(self, json: dict[str, Any]) -> None:
-        if "numeroContrat" in json:
-            self.id = json["numeroContrat"]
+API_BASE_URL = "https://ael.agur.fr/webapi"
+# Maximum number of in-flight requests a single client sends to the Agur API, unless sized for a number of contracts
+MAX_CONCURRENT_REQUESTS = 20
+# Number of requests a contract refresh sends concurrently, to size the in-flight requests of a client from the number
+# of contracts it refreshes at the same time
+REQUESTS_PER_CONTRACT = 4
+# Number of items requested per page from the paginated endpoints
+PAGE_SIZE = 25
+# Maximum time for a request to complete, including reading its body
+REQUEST_TIMEOUT = ClientTimeout(total=30)
+# Number of times a failed request is retried, and the bounds of the exponential backoff between two attempts, in seconds
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+# Number of consecutive failed requests after which the circuit breaker stops requests, and for how long, in seconds
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_COOLDOWN = 300.0
 
-        if "nomClientTitulaire" in json:
-            self.owner = json["nomClientTitulaire"]
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+T = TypeVar("T")
 
-        if "adresseLivraisonConstruite" in json:
-            self.address = json["adresseLivraisonConstruite"]
 
-        if "identifiantAppareil" in json and json["identifiantAppareil"] != "0":
-            self.meter_id = json["identifiantAppareil"]
+class AgurCircuitOpenError(Exception):
+    """Error to indicate that requests are paused because the Agur API keeps failing."""
 
-        if "numeroPhysiqueAppareil" in json:
-            self.meter_serial_number = json["numeroPhysiqueAppareil"]
 
-        if "numeroPointLivraison" in json:
-            self.meter_endpoint_number = json["numeroPointLivraison"]
+def _endpoint_name(path: str) -> str:
+    """Return the name of the endpoint of a path, i.e. without its parameters, e.g. `Facture/listeFactures`."""
+    return "/".join(path.split("?", 1)[0].split("/", 2)[:2])
 
 
-class AgurInvoice:
-    number: str | None = None
-    total: float | None = None
-    issue_date: datetime | None = None
-    payment_date: datetime | None = None
+def _is_retryable(exception: Exception) -> bool:
+    if isinstance(exception, ClientResponseError):
+        return exception.status == 429 or exception.status >= 500
+    return True
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> datetime:
+    """Parse a date from the API. The same dates come back on every refresh, so they are only parsed once."""
+    return datetime.fromisoformat(value)
+
+
+def parse_french_decimal(value: str) -> float:
+    """Parse a decimal formatted the French way, e.g. `1.234,56`."""
+    # Two replacements are faster than a single `str.translate`, which maps the characters one at a time
+    return float(value.replace(".", "").replace(",", "."))
+
+
+class AgurContract:
+    __slots__ = ("id", "owner", "address", "meter_id", "meter_serial_number", "meter_endpoint_number")
+
+    id: str | None
+    owner: str | None
+    address: str | None
+    meter_id: str | None
+    meter_serial_number: str | None
+    meter_endpoint_number: str | None
 
     def __init__(self, json: dict[str, Any]) -> None:
-        if "numeroFactureClient" in json:
-            self.number = json["numeroFactureClient"]
+        get = json.get
+        self.id = get("numeroContrat")
+        self.owner = get("nomClientTitulaire")
+        self.address = get("adresseLivraisonConstruite")
+        meter_id = get("identifiantAppareil")
+        self.meter_id = meter_id if meter_id != "0" else None
+        self.meter_serial_number = get("numeroPhysiqueAppareil")
+        self.meter_endpoint_number = get("numeroPointLivraison")
+
+    def to_json(self) -> dict[str, Any]:
+        """Return the contract in the format of the API, i.e. the one expected by the constructor."""
+        json = {
+            "numeroContrat": self.id,
+            "nomClientTitulaire": self.owner,
+            "adresseLivraisonConstruite": self.address,
+            "numeroPhysiqueAppareil": self.meter_serial_number,
+            "numeroPointLivraison": self.meter_endpoint_number,
+        }
+        if self.meter_id is not None:
+            json["identifiantAppareil"] = self.meter_id
+        return json
 
-        if "montantTTCFacture" in json:
-            self.total = float(json["montantTTCFacture"])
 
-        if "dateEmissionFacture" in json:
-            self.issue_date = datetime.fromisoformat(json["dateEmissionFacture"])
+class AgurInvoice:
+    __slots__ = ("number", "total", "issue_date", "payment_date")
 
-        if "dateLimitePaiementFacture" in json:
-            self.payment_date = datetime.fromisoformat(json["dateLimitePaiementFacture"])
+    number: str | None
+    total: float | None
+    issue_date: datetime | None
+    payment_date: datetime | None
+
+    def __init__(self, json: dict[str, Any]) -> None:
+        get = json.get
+        self.number = get("numeroFactureClient")
+        total = get("montantTTCFacture")
+        self.total = float(total) if total is not None else None
+        issue_date = get("dateEmissionFacture")
+        self.issue_date = parse_date(issue_date) if issue_date is not None else None
+        payment_date = get("dateLimitePaiementFacture")
+        self.payment_date = parse_date(payment_date) if payment_date is not None else None
+
+    def to_json(self) -> dict[str, Any]:
+        """Return the invoice in the format of the API, i.e. the one expected by the constructor."""
+        json: dict[str, Any] = {"numeroFactureClient": self.number}
+        if self.total is not None:
+            json["montantTTCFacture"] = self.total
+        if self.issue_date is not None:
+            json["dateEmissionFacture"] = self.issue_date.isoformat()
+        if self.payment_date is not None:
+            json["dateLimitePaiementFacture"] = self.payment_date.isoformat()
+        return json
 
 
 class AgurDataPoint:
-    value: float | None = None
-    date: datetime | None = None
+    __slots__ = ("value", "date")
 
-    def __init__(self, json: dict[str, Any]) -> None:
-        if "valeurIndex" in json:
-            self.value = float(json["valeurIndex"])
+    value: float | None
+    date: datetime | None
 
-        if "dateReleve" in json:
-            self.date = datetime.fromisoformat(json["dateReleve"])
+    def __init__(self, json: dict[str, Any]) -> None:
+        value = json.get("valeurIndex")
+        self.value = float(value) if value is not None else None
+        date = json.get("dateReleve")
+        self.date = parse_date(date) if date is not None else None
+
+    @classmethod
+    def from_values(cls, date: datetime, value: float) -> AgurDataPoint:
+        data_point = cls.__new__(cls)
+        data_point.date = date
+        data_point.value = value
+        return data_point
+
+
+class AgurRateLimiter:
+    """Token bucket limiting the rate of requests sent to the Agur API, shared by all the clients using it."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """Initialize with `rate` requests per second on average, and bursts of up to `burst` requests."""
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        # Waiters go through the bucket one at a time, in order
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AgurCircuitBreaker:
+    """
+    Circuit breaker for the Agur API, shared by all the clients using it.
+
+    After `threshold` consecutive failures, requests are refused for `cooldown` seconds. Then a single request is let
+    through as a probe: the breaker closes again if it succeeds, or stays open for another `cooldown` if it fails.
+    """
+
+    def __init__(self, threshold: int = CIRCUIT_BREAKER_THRESHOLD, cooldown: float = CIRCUIT_BREAKER_COOLDOWN) -> None:
+        """Initialize."""
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: float | None = None
+        # When the probe was let through, if any. A probe that never reports back, e.g. because it was cancelled, is
+        # given up after `cooldown` as well.
+        self._probe_started_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+
+        now = time.monotonic()
+        if now - self._opened_at < self.cooldown:
+            return False
+        if self._probe_started_at is not None and now - self._probe_started_at < self.cooldown:
+            return False
+        self._probe_started_at = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probe_started_at is not None or self.failures >= self.threshold:
+            self._opened_at = time.monotonic()
+        self._probe_started_at = None
 
 
 class AgurClient:
@@ -75,12 +234,116 @@ class AgurClient:
     session_token = None
     auth_token = None
 
-    def __init__(self, session_token: str = None, auth_token: str = None):
+    def __init__(
+            self,
+            session: ClientSession,
+            session_token: str = None,
+            auth_token: str = None,
+            rate_limiter: AgurRateLimiter | None = None,
+            circuit_breaker: AgurCircuitBreaker | None = None,
+            base_url: str | None = None,
+            metrics: AgurMetrics | None = None,
+            max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS
+    ):
+        # The session is expected to be the pooled Home Assistant one, so that connections to the API are kept alive
+        # and reused across calls instead of going through a new TCP + TLS handshake for every request.
+        self.session = session
         self.session_token = session_token
         self.auth_token = auth_token
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        # Only meant to be changed to point the client to a local replay of the API, e.g. the fake one of the tests
+        self.base_url = base_url if base_url is not None else API_BASE_URL
+        self.metrics = metrics
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._responses: dict[str, _CachedResponse] = {}
+        self._lists: dict[str, list[Any]] = {}
+
+    async def _request(self, method: str, path: str, headers: dict[str, str], json: Any = None) -> Any:
+        _, body, _ = await self._send(method, path, headers=headers, json=json)
+        # The API does not always send an `application/json` content type, e.g. for the balance
+        return json_loads(body)
+
+    async def _send(
+            self,
+            method: str,
+            path: str,
+            headers: dict[str, str],
+            json: Any = None
+    ) -> tuple[int, bytes, Mapping[str, str]]:
+        """
+        Send a request and return its status, body and headers.
+
+        Timeouts, connection errors, `429` and `5xx` responses are retried with a jittered exponential backoff. Once
+        the retries are exhausted, the failure is reported to the circuit breaker, which stops all requests to the API
+        after too many of them.
+        """
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            raise AgurCircuitOpenError("Too many failures from the Agur API, requests are paused")
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+
+            start = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    async with self.session.request(
+                            method,
+                            f"{self.base_url}/{path}",
+                            headers=headers,
+                            json=json,
+                            timeout=REQUEST_TIMEOUT
+                    ) as response:
+                        if response.status != 304:
+                            response.raise_for_status()
+                        body = await response.read()
+                        result = (response.status, body, response.headers)
+            except (asyncio.TimeoutError, ClientError) as exception:
+                if self.metrics is not None:
+                    self.metrics.record_time(f"http.{_endpoint_name(path)}", time.perf_counter() - start)
+                    self.metrics.increment("http_calls")
+                    self.metrics.increment("http_errors")
+                if not _is_retryable(exception):
+                    if self.circuit_breaker is not None:
+                        # The API answered, so it is up
+                        self.circuit_breaker.record_success()
+                    raise exception
+                if attempt >= MAX_RETRIES:
+                    if self.circuit_breaker is not None:
+                        self.circuit_breaker.record_failure()
+                    raise exception
+
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                if isinstance(exception, ClientResponseError) and exception.headers is not None:
+                    retry_after = exception.headers.get("Retry-After")
+                    if retry_after is not None and retry_after.isdigit():
+                        delay = max(delay, float(retry_after))
+                attempt += 1
+                if self.metrics is not None:
+                    self.metrics.increment("http_retries")
+                _LOGGER.debug(f"Request to {path} failed ({exception}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if self.metrics is not None:
+                self.metrics.record_time(f"http.{_endpoint_name(path)}", time.perf_counter() - start)
+                self.metrics.increment("http_calls")
+                self.metrics.increment("http_bytes", len(result[1]))
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_success()
+            return result
+
+    def _auth_headers(self) -> dict[str, str]:
+        return {
+            "ConversationId": self.app_id,
+            "User-Agent": self.user_agent,
+            "Token": self.auth_token,
+        }
 
-    def init(self) -> dict[str, Any]:
-        response = post("https://ael.agur.fr/webapi/Acces/generateToken", headers={
+    async def init(self) -> dict[str, Any]:
+        return await self._request("POST", "Acces/generateToken", headers={
             "ConversationId": self.app_id,
             "Token": self.access_key,
             "Content-Type": "application/json;charset=utf-8",
@@ -91,12 +354,9 @@ class AgurClient:
             "ClientId": "AEL-TOKEN-AGR-PRD",
             "AccessKey": self.access_key,
         })
-        response.raise_for_status()
 
-        return response.json()
-
-    def login(self, username, password) -> dict[str, Any]:
-        response = post("https://ael.agur.fr/webapi/Utilisateur/authentification", headers={
+    async def login(self, username, password) -> dict[str, Any]:
+        return await self._request("POST", "Utilisateur/authentification", headers={
             "ConversationId": self.app_id,
             "Token": self.session_token,
             "Content-Type": "application/json;charset=utf-8",
@@ -106,63 +366,163 @@ class AgurClient:
             "identifiant": username,
             "motDePasse": password,
         })
-        response.raise_for_status()
-
-        return response.json()
-
-    def get_contracts(self) -> list[AgurContract]:
-        response = get(
-            "https://ael.agur.fr/webapi/Abonnement/contrats?userWebId=&recherche=&tri=NumeroContrat&triDecroissant=false&indexPage=0&nbElements=25",
-            headers={
-                "ConversationId": self.app_id,
-                "User-Agent": self.user_agent,
-                "Token": self.auth_token,
-            })
-        response.raise_for_status()
-
-        return list(map(lambda contract: AgurContract(json=contract), response.json()["resultats"]))
-
-    def get_contract(self, contract_id: str) -> AgurContract:
-        response = get(
-            f"https://ael.agur.fr/webapi/Abonnement/detailAbonnement/{contract_id}",
-            headers={
-                "ConversationId": self.app_id,
-                "User-Agent": self.user_agent,
-                "Token": self.auth_token,
-            })
-        response.raise_for_status()
-
-        return AgurContract(json=response.json())
-
-    def get_data(self, contract_id) -> list[AgurDataPoint]:
-        response = get(f"https://ael.agur.fr/webapi/Facturation/listeConsommationsFacturees/{contract_id}", headers={
-            "ConversationId": self.app_id,
-            "User-Agent": self.user_agent,
-            "Token": self.auth_token,
-        })
-        response.raise_for_status()
-
-        return list(map(lambda json: AgurDataPoint(json=json), response.json()["resultats"]))
-
-    def get_invoices(self, contract_id) -> list[AgurInvoice]:
-        response = get(
-            f"https://ael.agur.fr/webapi/Facture/listeFactures?numeroContrat={contract_id}&recherche=&tri=&triDecroissant=false&indexPage=0&nbElements=25&dateDebut=&dateFin=&listeColonnes=&profondeurHistorique=-1",
-            headers={
-                "ConversationId": self.app_id,
-                "User-Agent": self.user_agent,
-                "Token": self.auth_token,
-            })
-        response.raise_for_status()
-
-        return list(map(lambda json: AgurInvoice(json=json), response.json()["resultats"]))
-
-    def get_balance(self, contract_id) -> float:
-        response = get(f"https://ael.agur.fr/webapi/Facturation/soldeComptableContratAbonnement/{contract_id}",
-                       headers={
-                           "ConversationId": self.app_id,
-                           "User-Agent": self.user_agent,
-                           "Token": self.auth_token,
-                       })
-        response.raise_for_status()
-
-        return float(response.json().replace('.', '').replace(',', '.'))
+
+    async def get_contracts(self) -> list[AgurContract]:
+        async with aclosing(self.iter_contracts()) as contracts:
+            return [contract async for contract in contracts]
+
+    def iter_contracts(self) -> AsyncIterator[AgurContract]:
+        """Iterate over all the contracts of the account, page by page."""
+        return self._paginate(
+            lambda page: f"Abonnement/contrats?userWebId=&recherche=&tri=NumeroContrat&triDecroissant=false&indexPage={page}&nbElements={PAGE_SIZE}",
+            lambda response: list(map(AgurContract, response["resultats"])))
+
+    async def get_contract(self, contract_id: str) -> AgurContract:
+        return await self._get(
+            f"Abonnement/detailAbonnement/{contract_id}",
+            AgurContract)
+
+    async def get_data(self, contract_id, since: datetime | None = None) -> list[AgurDataPoint]:
+        """Return the index readings, most recent first. If `since` is set, readings older than it are not parsed."""
+        return await self._get(
+            f"Facturation/listeConsommationsFacturees/{contract_id}",
+            lambda response: self._parse_data_points(response["resultats"], since),
+            variant=since)
+
+    async def get_invoices(self, contract_id, limit: int | None = None) -> list[AgurInvoice]:
+        """Return the invoices of a contract, or only the first `limit` ones if set."""
+        invoices = []
+        async with aclosing(self.iter_invoices(contract_id)) as iterator:
+            async for invoice in iterator:
+                invoices.append(invoice)
+                if limit is not None and len(invoices) >= limit:
+                    break
+
+        # Keep returning the same list when the invoices did not change, like for the other endpoints
+        key = f"invoices#{contract_id}#{limit}"
+        previous = self._lists.get(key)
+        if previous is not None and len(previous) == len(invoices) and all(map(operator.is_, previous, invoices)):
+            return previous
+        self._lists[key] = invoices
+        return invoices
+
+    def iter_invoices(self, contract_id) -> AsyncIterator[AgurInvoice]:
+        """Iterate over all the invoices of a contract, page by page."""
+        return self._paginate(
+            lambda page: f"Facture/listeFactures?numeroContrat={contract_id}&recherche=&tri=&triDecroissant=false&indexPage={page}&nbElements={PAGE_SIZE}&dateDebut=&dateFin=&listeColonnes=&profondeurHistorique=-1",
+            lambda response: list(map(AgurInvoice, response["resultats"])))
+
+    async def get_balance(self, contract_id) -> float:
+        return await self._get(
+            f"Facturation/soldeComptableContratAbonnement/{contract_id}",
+            parse_french_decimal)
+
+    async def _get(self, path: str, parse: Callable[[Any], T], variant: Any = None) -> T:
+        """
+        Send a GET request and return its parsed response.
+
+        If the response did not change since the previous call for the same path and `variant`, i.e. the arguments of
+        `parse` other than the response, either because the server answers `304 Not Modified` to the conditional
+        request or because the body is identical, the previously parsed value is returned as is, i.e. the very same
+        object, without decoding the body again. Only the last response of each path is kept.
+        """
+        cached = self._responses.get(path)
+        if cached is not None and cached.variant != variant:
+            # The previous response was parsed differently, it cannot be reused
+            cached = None
+
+        headers = self._auth_headers()
+        if cached is not None and cached.etag is not None:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified is not None:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        status, body, response_headers = await self._send("GET", path, headers=headers)
+        if status == 304 and cached is not None:
+            if self.metrics is not None:
+                self.metrics.increment("http_unchanged")
+            return cached.value
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+
+        body_hash = hashlib.blake2b(body, digest_size=16).digest()
+        if cached is not None and cached.body_hash == body_hash:
+            cached.etag = etag
+            cached.last_modified = last_modified
+            if self.metrics is not None:
+                self.metrics.increment("http_unchanged")
+            return cached.value
+
+        if self.metrics is not None:
+            with self.metrics.timer(f"parse.{_endpoint_name(path)}"):
+                value = parse(json_loads(body))
+        else:
+            value = parse(json_loads(body))
+        self._responses[path] = _CachedResponse(variant, etag, last_modified, body_hash, value)
+        return value
+
+    async def _paginate(
+            self,
+            path_for_page: Callable[[int], str],
+            parse: Callable[[Any], list[T]]
+    ) -> AsyncIterator[T]:
+        """
+        Iterate over the items of a paginated endpoint.
+
+        The next page is requested while the items of the current one are consumed, and is cancelled if the caller stops
+        iterating before reaching it.
+        """
+        page = 0
+        next_page: asyncio.Task | None = asyncio.create_task(self._get(path_for_page(page), parse))
+        try:
+            while next_page is not None:
+                items = await next_page
+                next_page = None
+                # A full page means there might be more
+                if len(items) >= PAGE_SIZE:
+                    page += 1
+                    next_page = asyncio.create_task(self._get(path_for_page(page), parse))
+                for item in items:
+                    yield item
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    @staticmethod
+    def _parse_data_points(results: list[dict[str, Any]], since: datetime | None) -> list[AgurDataPoint]:
+        """
+        Parse the index readings from date descending, only the ones from `since` if set.
+
+        The API returns the readings from date descending, but does not guarantee it: they are sorted anyway, which only
+        takes linear time when they already are. Readings at the same date, e.g. the removal and installation readings
+        of a meter replacement, keep the order of the API. Readings without a date or a value are skipped.
+        """
+        data_points = [
+            data_point
+            for data_point in map(AgurDataPoint, results)
+            if data_point.date is not None
+            and data_point.value is not None
+            and (since is None or data_point.date >= since)
+        ]
+        data_points.sort(key=operator.attrgetter("date"), reverse=True)
+        return data_points
+
+
+class _CachedResponse:
+    """Validators and parsed value of the last response to a GET request."""
+
+    __slots__ = ("variant", "etag", "last_modified", "body_hash", "value")
+
+    def __init__(
+            self,
+            variant: Any,
+            etag: str | None,
+            last_modified: str | None,
+            body_hash: bytes,
+            value: Any
+    ) -> None:
+        self.variant = variant
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.value = value
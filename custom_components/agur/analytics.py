@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .agur_client import AgurDataPoint, AgurInvoice
+from .anomaly import AgurAnomalyDetector
+from .const import STORAGE_VERSION, analytics_storage_key
+from .series import AgurDataSeries
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+# Periods of the rolling averages of the consumption
+SHORT_WINDOW = timedelta(days=7)
+LONG_WINDOW = timedelta(days=30)
+# Delay before writing the accumulators to disk, so that several changes end up in a single write
+ANALYTICS_SAVE_DELAY = 60
+SECONDS_PER_DAY = 86400
+
+
+class AgurRollingWindow:
+    """Class to keep the consumption of the readings within a period before the most recent one, and its totals."""
+
+    __slots__ = ("duration", "readings", "consumption", "elapsed")
+
+    def __init__(self, duration: timedelta) -> None:
+        """Initialize."""
+        self.duration = duration.total_seconds()
+        # Timestamp, index, consumption since the previous reading and time elapsed since it, of each reading
+        self.readings: deque[tuple[float, float, float, float]] = deque()
+        self.consumption = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def daily_average(self) -> float | None:
+        return self.consumption / self.elapsed * SECONDS_PER_DAY if self.elapsed > 0 else None
+
+    def append(self, reading: tuple[float, float, float, float]) -> None:
+        self.readings.append(reading)
+        self.consumption += reading[2]
+        self.elapsed += reading[3]
+        while self.readings[0][0] <= reading[0] - self.duration:
+            _, _, consumption, elapsed = self.readings.popleft()
+            self.consumption -= consumption
+            self.elapsed -= elapsed
+
+    def pop(self) -> tuple[float, float, float, float]:
+        reading = self.readings.pop()
+        self.consumption -= reading[2]
+        self.elapsed -= reading[3]
+        return reading
+
+
+class AgurConsumptionAnalytics:
+    """
+    Class to derive the consumption of a contract from its readings, persisted on disk across restarts.
+
+    The accumulators are only fed with the readings more recent than the last one they were fed with, so that updating
+    them does not depend on the length of the history. A correction of the readings within `LONG_WINDOW` is handled by
+    rewinding the accumulators to the reading before it.
+    """
+
+    def __init__(self, hass: HomeAssistant, contract_id: str) -> None:
+        """Initialize."""
+        self.contract_id = contract_id
+        self._store = Store(hass, STORAGE_VERSION, analytics_storage_key(contract_id))
+        self._loaded = False
+        # The detector only ever learns from new readings, it is kept when the accumulators are rewound or reset
+        self.detector = AgurAnomalyDetector()
+        # The readings found anomalous during the last update
+        self.anomalies: list[dict[str, Any]] = []
+        self._seeding = False
+        self._reset()
+
+    def _reset(self) -> None:
+        # The last reading fed to the accumulators
+        self.last_timestamp: float | None = None
+        self.last_value: float | None = None
+        self.last_consumption: float | None = None
+        self.year: int | None = None
+        self.year_to_date = 0.0
+        # The issue date of the last invoice, and the index at that date
+        self.invoice_timestamp: float | None = None
+        self.invoice_index: float | None = None
+        self.projected_invoice_volume: float | None = None
+        self._short = AgurRollingWindow(SHORT_WINDOW)
+        self._long = AgurRollingWindow(LONG_WINDOW)
+
+    @property
+    def short_average(self) -> float | None:
+        return self._short.daily_average
+
+    @property
+    def long_average(self) -> float | None:
+        return self._long.daily_average
+
+    async def async_load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+
+        stored = await self._store.async_load()
+        if not stored:
+            return
+
+        try:
+            self.last_timestamp = stored["last_timestamp"]
+            self.last_value = stored["last_value"]
+            self.last_consumption = stored["last_consumption"]
+            self.year = stored["year"]
+            self.year_to_date = stored["year_to_date"]
+            self.invoice_timestamp = stored["invoice_timestamp"]
+            self.invoice_index = stored["invoice_index"]
+            self.projected_invoice_volume = stored["projected_invoice_volume"]
+            for reading in stored["readings"]:
+                self._long.append(tuple(reading))
+            self._rebuild_short_window()
+            if "detector" in stored:
+                self.detector = AgurAnomalyDetector.from_json(stored["detector"])
+        except (KeyError, TypeError, IndexError) as exception:
+            _LOGGER.debug(f"Ignoring invalid analytics for contract '{self.contract_id}': {exception}")
+            self.detector = AgurAnomalyDetector()
+            self._reset()
+
+    async def async_remove(self) -> None:
+        self.detector = AgurAnomalyDetector()
+        self._reset()
+        await self._store.async_remove()
+
+    def update(
+            self,
+            series: AgurDataSeries,
+            changed_data_points: list[AgurDataPoint],
+            invoices: list[AgurInvoice],
+            invoice_interval: timedelta | None
+    ) -> None:
+        """Feed the readings of the series that are new or changed, sorted from date descending, since last time."""
+        self.anomalies = []
+        if len(series) == 0:
+            return
+
+        # The changed readings are the most recent first
+        changed_since = changed_data_points[-1].date.timestamp() if len(changed_data_points) > 0 else None
+        if self.last_timestamp is not None:
+            latest = series.timestamps[-1]
+            if latest < self.last_timestamp:
+                # Readings fed before were removed from the history since, e.g. it was not saved before a restart
+                changed_since = latest if changed_since is None else min(changed_since, latest)
+            if changed_since is not None and changed_since <= self.last_timestamp:
+                self._rewind(series, changed_since)
+
+        if self.last_timestamp is None:
+            self._seed(series)
+        else:
+            for index in range(bisect_right(series.timestamps, self.last_timestamp), len(series)):
+                self._feed(series, series.timestamps[index], series.values[index])
+
+        self._update_invoice(series, invoices, invoice_interval)
+        self._store.async_delay_save(self._data_to_save, ANALYTICS_SAVE_DELAY)
+
+    def _seed(self, series: AgurDataSeries) -> None:
+        """Start from the readings of the current year, or of the long window if it starts before."""
+        latest_date = series.latest_date
+        since = min(
+            latest_date.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0),
+            latest_date - LONG_WINDOW
+        )
+        # Start with the reading before, so that the consumption of the first period is known
+        first = max(bisect_left(series.timestamps, since.timestamp()) - 1, 0)
+        _LOGGER.debug(f"Computing the analytics of contract '{self.contract_id}' from {len(series) - first} readings")
+        # The detector learns from these readings, but they are not reported: they are not new
+        self._seeding = True
+        for index in range(first, len(series)):
+            self._feed(series, series.timestamps[index], series.values[index])
+        self._seeding = False
+
+    def _feed(self, series: AgurDataSeries, timestamp: float, value: float) -> None:
+        year = series.to_datetime(timestamp).year
+        if self.last_timestamp is None:
+            self.last_timestamp = timestamp
+            self.last_value = value
+            self.year = year
+            return
+
+        # A reading lower than the previous one, i.e. the meter was reset or replaced, counts as no consumption
+        consumption = max(value - self.last_value, 0.0)
+        elapsed = timestamp - self.last_timestamp
+        reading = (timestamp, value, consumption, elapsed)
+        self._short.append(reading)
+        self._long.append(reading)
+
+        if year != self.year:
+            self.year = year
+            self.year_to_date = 0.0
+        self.year_to_date += consumption
+
+        # Two readings at the same time, e.g. the removal and installation readings of a meter replacement, have no
+        # consumption per day to learn from
+        if elapsed > 0:
+            self._detect(series, timestamp, consumption / elapsed * SECONDS_PER_DAY)
+
+        self.last_timestamp = timestamp
+        self.last_value = value
+        self.last_consumption = consumption
+
+    def _detect(self, series: AgurDataSeries, timestamp: float, daily_consumption: float) -> None:
+        expected = self.detector.mean
+        anomaly = self.detector.update(timestamp, daily_consumption)
+        if anomaly is not None and not self._seeding:
+            self.anomalies.append({
+                "type": anomaly,
+                "date": series.to_datetime(timestamp).isoformat(),
+                "daily_consumption": daily_consumption,
+                "expected_daily_consumption": expected,
+                "score": self.detector.score,
+            })
+
+    def _rewind(self, series: AgurDataSeries, timestamp: float) -> None:
+        """Remove the readings from `timestamp` from the accumulators, or reset them if they are not all kept."""
+        if timestamp <= self.last_timestamp - self._long.duration:
+            self._reset()
+            return
+
+        while len(self._long.readings) > 0 and self._long.readings[-1][0] >= timestamp:
+            reading_timestamp, _, consumption, _ = self._long.pop()
+            if series.to_datetime(reading_timestamp).year == self.year:
+                self.year_to_date -= consumption
+        if self.invoice_timestamp is not None and timestamp <= self.invoice_timestamp:
+            # The index at the issue date of the invoice might have changed
+            self.invoice_timestamp = None
+
+        if len(self._long.readings) == 0:
+            # The reading before `timestamp` is too old to be kept, the accumulators start over from the history
+            self._reset()
+            return
+
+        self.last_timestamp, self.last_value, self.last_consumption, _ = self._long.readings[-1]
+        self._rebuild_short_window()
+
+    def _rebuild_short_window(self) -> None:
+        self._short = AgurRollingWindow(SHORT_WINDOW)
+        for reading in self._long.readings:
+            self._short.append(reading)
+
+    def _update_invoice(
+            self,
+            series: AgurDataSeries,
+            invoices: list[AgurInvoice],
+            invoice_interval: timedelta | None
+    ) -> None:
+        issue_date = invoices[0].issue_date if len(invoices) > 0 else None
+        if issue_date is None:
+            self.invoice_timestamp = None
+            self.invoice_index = None
+            self.projected_invoice_volume = None
+            return
+
+        if issue_date.timestamp() > series.timestamps[-1]:
+            # The index at the issue date of the invoice is not known until a reading after it shows up
+            self.invoice_timestamp = None
+            self.invoice_index = None
+        elif issue_date.timestamp() != self.invoice_timestamp:
+            # The consumption since a new invoice is the difference with the index at its issue date
+            self.invoice_timestamp = issue_date.timestamp()
+            self.invoice_index = series.value_at(issue_date)
+
+        average = self.long_average
+        if self.invoice_index is None or invoice_interval is None or average is None:
+            self.projected_invoice_volume = None
+            return
+
+        # The consumption until the next invoice is expected, at the average of the last days
+        remaining = (self.invoice_timestamp + invoice_interval.total_seconds() - self.last_timestamp) / SECONDS_PER_DAY
+        since_invoice = max(self.last_value - self.invoice_index, 0.0)
+        self.projected_invoice_volume = since_invoice + average * max(remaining, 0.0)
+
+    def _data_to_save(self) -> dict[str, Any]:
+        return {
+            "last_timestamp": self.last_timestamp,
+            "last_value": self.last_value,
+            "last_consumption": self.last_consumption,
+            "year": self.year,
+            "year_to_date": self.year_to_date,
+            "invoice_timestamp": self.invoice_timestamp,
+            "invoice_index": self.invoice_index,
+            "projected_invoice_volume": self.projected_invoice_volume,
+            "readings": [list(reading) for reading in self._long.readings],
+            "detector": self.detector.to_json(),
+        }
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from math import sqrt
+from typing import Any
+
+# Weight of a new reading in the moving average and variance of the consumption per day
+ANOMALY_WEIGHT = 0.1
+# Number of readings learned from before any of them can be reported as anomalous
+ANOMALY_WARMUP = 14
+# Number of standard deviations above the usual consumption from which a single reading is anomalous
+SPIKE_THRESHOLD = 3.0
+# Number of standard deviations above the usual consumption, and number of readings in a row above it, from which
+# the consumption is considered to be leaking
+LEAK_THRESHOLD = 2.0
+LEAK_READINGS = 3
+
+ANOMALY_SPIKE = "spike"
+ANOMALY_LEAK = "leak"
+
+
+class AgurAnomalyDetector:
+    """
+    Class to tell whether the consumption per day of each new reading of a contract is unusually high.
+
+    The usual consumption is the exponentially weighted moving average and variance of the consumption of the previous
+    readings, so that it adapts to the contract in constant memory. An anomalous reading moves them as if it were only
+    `SPIKE_THRESHOLD` standard deviations away, so that a single spike or a leak does not become the new usual.
+    """
+
+    __slots__ = ("last_timestamp", "count", "mean", "variance", "score", "elevated", "anomaly")
+
+    def __init__(self) -> None:
+        """Initialize."""
+        # The last reading learned from, so that a reading fed again after a correction is not learned twice
+        self.last_timestamp: float | None = None
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        # Number of standard deviations of the last reading from the usual consumption
+        self.score: float | None = None
+        # Number of readings in a row above `LEAK_THRESHOLD`
+        self.elevated = 0
+        # The anomaly of the last reading, if any
+        self.anomaly: str | None = None
+
+    @classmethod
+    def from_json(cls, json: dict[str, Any]) -> AgurAnomalyDetector:
+        detector = cls()
+        detector.last_timestamp = json["last_timestamp"]
+        detector.count = json["count"]
+        detector.mean = json["mean"]
+        detector.variance = json["variance"]
+        detector.score = json["score"]
+        detector.elevated = json["elevated"]
+        detector.anomaly = json["anomaly"]
+        return detector
+
+    @property
+    def deviation(self) -> float:
+        return sqrt(self.variance)
+
+    def update(self, timestamp: float, daily_consumption: float) -> str | None:
+        """Learn from a reading more recent than the last one learned from, and return its anomaly if any."""
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return None
+        self.last_timestamp = timestamp
+
+        if self.count == 0:
+            self.count = 1
+            self.mean = daily_consumption
+            return None
+
+        difference = daily_consumption - self.mean
+        deviation = self.deviation
+        self.score = difference / deviation if deviation > 0 else 0.0
+
+        self.anomaly = None
+        if self.count >= ANOMALY_WARMUP:
+            self.elevated = self.elevated + 1 if self.score >= LEAK_THRESHOLD else 0
+            if self.elevated >= LEAK_READINGS:
+                self.anomaly = ANOMALY_LEAK
+            elif self.score >= SPIKE_THRESHOLD:
+                self.anomaly = ANOMALY_SPIKE
+            if deviation > 0:
+                difference = max(min(difference, SPIKE_THRESHOLD * deviation), -SPIKE_THRESHOLD * deviation)
+
+        self.mean += ANOMALY_WEIGHT * difference
+        self.variance = (1 - ANOMALY_WEIGHT) * (self.variance + ANOMALY_WEIGHT * difference * difference)
+        self.count += 1
+        return self.anomaly
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "last_timestamp": self.last_timestamp,
+            "count": self.count,
+            "mean": self.mean,
+            "variance": self.variance,
+            "score": self.score,
+            "elevated": self.elevated,
+            "anomaly": self.anomaly,
+        }
@@ -0,0 +1,142 @@
+"""Binary sensor platform for Agur."""
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from homeassistant.components.binary_sensor import BinarySensorEntity, BinarySensorDeviceClass, \
+    BinarySensorEntityDescription
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN
+from .const import BINARY_SENSOR_PLATFORM
+from .coordinator import AgurDataUpdateCoordinator
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+BINARY_SENSORS: tuple[BinarySensorEntityDescription, ...] = (
+    BinarySensorEntityDescription(
+        key="consumption_anomaly",
+        translation_key="consumption_anomaly",
+        icon="mdi:water-alert",
+        device_class=BinarySensorDeviceClass.PROBLEM,
+    ),
+)
+
+
+async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities: AddEntitiesCallback):
+    """Add Agur binary sensors from a config_entry."""
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    entities = []
+    for contract_id in coordinator.contract_ids:
+        if contract_id not in coordinator.data:
+            continue
+        _LOGGER.debug(f"Add binary sensor for Agur contract {contract_id}")
+        for entity_description in BINARY_SENSORS:
+            entities.append(AgurAnomalyBinarySensor(
+                coordinator=coordinator,
+                contract_id=contract_id,
+                unique_id=config_entry.entry_id,
+                entity_description=entity_description
+            ))
+    async_add_entities(entities, False)
+
+
+class AgurAnomalyBinarySensor(CoordinatorEntity[AgurDataUpdateCoordinator], BinarySensorEntity):
+    """Agur binary sensor class telling whether the last reading of a contract shows an unusual consumption."""
+    _attr_has_entity_name = True
+
+    def __init__(
+            self,
+            coordinator: AgurDataUpdateCoordinator,
+            unique_id: str,
+            contract_id: str,
+            entity_description: BinarySensorEntityDescription
+    ) -> None:
+        """Pass coordinator to CoordinatorEntity."""
+        super().__init__(coordinator=coordinator)
+
+        self.entity_description = entity_description
+
+        self.entity_id = f"{BINARY_SENSOR_PLATFORM}.{DOMAIN}_{entity_description.key}_{contract_id}"
+        self._attr_unique_id = f"{entity_description.key}_{contract_id}_{unique_id}"
+        self._contract_id = contract_id
+        # Availability, state and attributes last written, to skip the updates that would write the same ones
+        self._written_state: tuple[bool, bool | None, dict[str, Any] | None] | None = None
+
+    async def async_added_to_hass(self) -> None:
+        """Remember the state written when the entity is added."""
+        await super().async_added_to_hass()
+        self._written_state = self._current_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if it changed since it was last written."""
+        if (
+                self._written_state is not None
+                and self._written_state[0]
+                and self.coordinator.last_update_success
+                and self._contract_id not in self.coordinator.changed_contract_ids
+                and self._contract_id not in self.coordinator.stale_changed_contract_ids
+        ):
+            # The readings of the contract of this sensor were not analysed again
+            return
+
+        state = self._current_state()
+        if state == self._written_state:
+            return
+
+        self._written_state = state
+        self.async_write_ha_state()
+
+    def _current_state(self) -> tuple[bool, bool | None, dict[str, Any] | None]:
+        if not self.available:
+            return False, None, None
+        return True, self.is_on, self.extra_state_attributes
+
+    @property
+    def available(self) -> bool:
+        """Return if the readings of the contract of this sensor were analysed."""
+        return (
+                super().available
+                and self._contract_id in self.coordinator.data
+                and self._contract_id in self.coordinator.analytics
+        )
+
+    @property
+    def is_on(self) -> bool:
+        """Return whether the last reading is anomalous."""
+        return self.coordinator.analytics[self._contract_id].detector.anomaly is not None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return the attributes of the sensor."""
+        if not self.available:
+            return None
+
+        detector = self.coordinator.analytics[self._contract_id].detector
+        return {
+            "contract_id": self._contract_id,
+            "date": self.coordinator.data[self._contract_id].last_index_date,
+            "anomaly_type": detector.anomaly,
+            "score": detector.score,
+            "expected_daily_consumption": detector.mean,
+            "stale": self.coordinator.data[self._contract_id].stale,
+        }
+
+    @property
+    def device_info(self) -> DeviceInfo | None:
+        """Return the meter of the contract of this sensor."""
+        contract_data = self.coordinator.data.get(self._contract_id) if self.coordinator.data is not None else None
+        if contract_data is None:
+            return None
+
+        return DeviceInfo(
+            identifiers={(DOMAIN, contract_data.contract.meter_id)},
+            name=contract_data.contract.meter_serial_number,
+            serial_number=contract_data.contract.meter_serial_number
+        )
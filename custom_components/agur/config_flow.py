@@ -8,11 +8,16 @@ from homeassistant import config_entries, exceptions
 from homeassistant.core import callback, HomeAssistant
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.helpers import config_validation
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.selector import TextSelector, TextSelectorType, TextSelectorConfig
 from voluptuous import Schema
 
 from .agur_client import AgurClient
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, VERSION, CONF_CONTRACT_IDS, CONF_IMPORT_STATISTICS
+from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, VERSION, CONF_CONTRACT_IDS, CONF_IMPORT_STATISTICS, \
+    CONF_MAX_CONCURRENT_CONTRACTS, DEFAULT_MAX_CONCURRENT_CONTRACTS, CONF_MIN_UPDATE_INTERVAL, \
+    DEFAULT_MIN_UPDATE_INTERVAL, CONF_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL
+from .scheduler import async_get_fleet_scheduler
+from .token_manager import async_get_token_manager
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 AUTH_TOKEN = "auth"
@@ -36,24 +41,28 @@ USER_SCHEMA = vol.Schema(
 
 async def get_agur_tokens(hass: HomeAssistant, username: str, password: str) -> dict[str, str]:
     try:
-        tokens = {}
+        # Reuse the tokens of the coordinator of this account if any, instead of logging in again
+        token_manager = async_get_token_manager(hass, username, password)
+        session_token, auth_token = await token_manager.async_get_tokens()
 
-        client = AgurClient()
-        response = await hass.async_add_executor_job(client.init)
-        tokens[SESSION_TOKEN] = response["token"]
-        client = AgurClient(session_token=tokens[SESSION_TOKEN])
-        response = await hass.async_add_executor_job(client.login, username, password)
-        tokens[AUTH_TOKEN] = response["tokenAuthentique"]
-
-        return tokens
+        return {
+            SESSION_TOKEN: session_token,
+            AUTH_TOKEN: auth_token,
+        }
     except Exception as ex:
         raise AuthError(ex)
 
 
 async def get_agur_contract_options(hass: HomeAssistant, session_token: str, auth_token: str):
     try:
-        client = AgurClient(session_token=session_token, auth_token=auth_token)
-        return {c.id: f"Contract {c.id} ({c.address})" for c in await hass.async_add_executor_job(client.get_contracts)}
+        client = AgurClient(
+            session=async_get_clientsession(hass),
+            session_token=session_token,
+            auth_token=auth_token,
+            rate_limiter=async_get_fleet_scheduler(hass).rate_limiter,
+            circuit_breaker=async_get_fleet_scheduler(hass).circuit_breaker
+        )
+        return {c.id: f"Contract {c.id} ({c.address})" for c in await client.get_contracts()}
     except Exception as ex:
         raise ContractError(ex)
 
@@ -212,6 +221,18 @@ class AgurOptionFlow(config_entries.OptionsFlow):
         available_contracts = []
         default_contracts = self.config_entry.options.get(CONF_CONTRACT_IDS, [])
         default_import_statistics = self.config_entry.options.get(CONF_IMPORT_STATISTICS, False)
+        default_max_concurrent_contracts = self.config_entry.options.get(
+            CONF_MAX_CONCURRENT_CONTRACTS,
+            DEFAULT_MAX_CONCURRENT_CONTRACTS
+        )
+        default_min_update_interval = self.config_entry.options.get(
+            CONF_MIN_UPDATE_INTERVAL,
+            DEFAULT_MIN_UPDATE_INTERVAL.total_seconds() / 3600
+        )
+        default_max_update_interval = self.config_entry.options.get(
+            CONF_MAX_UPDATE_INTERVAL,
+            DEFAULT_MAX_UPDATE_INTERVAL.total_seconds() / 3600
+        )
 
         # We want to save here
         if user_input is not None:
@@ -260,6 +281,18 @@ class AgurOptionFlow(config_entries.OptionsFlow):
                         CONF_IMPORT_STATISTICS,
                         default=default_import_statistics
                     ): config_validation.boolean,
+                    vol.Optional(
+                        CONF_MAX_CONCURRENT_CONTRACTS,
+                        default=default_max_concurrent_contracts
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=50)),
+                    vol.Optional(
+                        CONF_MIN_UPDATE_INTERVAL,
+                        default=default_min_update_interval
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=168)),
+                    vol.Optional(
+                        CONF_MAX_UPDATE_INTERVAL,
+                        default=default_max_update_interval
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=168)),
                 }
             ),
             errors=errors,
@@ -1,6 +1,9 @@
 # Base component constants
+from datetime import timedelta
 from typing import Final
 
+from homeassistant.util import slugify
+
 DOMAIN: Final = "agur"
 DEFAULT_NAME: Final = "Agur"
 VERSION = 1
@@ -11,10 +14,60 @@ CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
 CONF_CONTRACT_IDS = "contract_ids"
 CONF_IMPORT_STATISTICS = "import_statistics"
+CONF_MAX_CONCURRENT_CONTRACTS = "max_concurrent_contracts"
+CONF_MIN_UPDATE_INTERVAL = "min_update_interval"
+CONF_MAX_UPDATE_INTERVAL = "max_update_interval"
+
+# Default options
+DEFAULT_MAX_CONCURRENT_CONTRACTS = 5
+DEFAULT_MIN_UPDATE_INTERVAL = timedelta(hours=2)
+DEFAULT_MAX_UPDATE_INTERVAL = timedelta(days=2)
+
+# Storage constants
+STORAGE_VERSION = 1
+
+
+def tokens_storage_key(username: str) -> str:
+    """Return the storage key holding the API tokens of an Agur account."""
+    return f"{DOMAIN}.{slugify(username)}.tokens"
+
+
+def snapshot_storage_key(username: str) -> str:
+    """Return the storage key holding the data of the last successful refresh of an Agur account."""
+    return f"{DOMAIN}.{slugify(username)}.snapshot"
+
+
+def backfill_storage_key(username: str) -> str:
+    """Return the storage key holding the progress of the import of the statistics of an Agur account."""
+    return f"{DOMAIN}.{slugify(username)}.backfill"
+
+
+def history_storage_key(contract_id: str) -> str:
+    """Return the storage key holding the index readings of an Agur contract."""
+    return f"{DOMAIN}.{slugify(contract_id)}.history"
+
+
+def analytics_storage_key(contract_id: str) -> str:
+    """Return the storage key holding the consumption accumulators of an Agur contract."""
+    return f"{DOMAIN}.{slugify(contract_id)}.analytics"
+
 
 # Other constants
+DATA_TOKEN_MANAGERS = "token_managers"
+DATA_FLEET_SCHEDULER = "fleet_scheduler"
 SENSOR_PLATFORM = "sensor"
-PLATFORMS = [SENSOR_PLATFORM]
+BINARY_SENSOR_PLATFORM = "binary_sensor"
+PLATFORMS = [SENSOR_PLATFORM, BINARY_SENSOR_PLATFORM]
+
+
+
+def metrics_signal(username: str) -> str:
+    """Return the dispatcher signal sent at the end of each refresh of an Agur account, successful or not."""
+    return f"{DOMAIN}_{slugify(username)}_metrics"
+
+
+# Fired for each new reading whose consumption is unusually high
+EVENT_CONSUMPTION_ANOMALY = f"{DOMAIN}_consumption_anomaly"
 
 STARTUP_MESSAGE = f"""
 ---------------------------------------------------------------------
@@ -2,55 +2,90 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from collections.abc import Awaitable, Callable
+from copy import copy
 from datetime import timedelta, datetime
+from typing import Any
 
 from homeassistant.components.recorder import get_instance
-from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
-from homeassistant.components.recorder.statistics import get_last_statistics, async_add_external_statistics
-from homeassistant.const import UnitOfVolume
+from homeassistant.components.recorder.statistics import async_add_external_statistics
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
-from requests import HTTPError
-
-from .agur_client import AgurClient, AgurContract, AgurDataPoint, AgurInvoice
-from .const import DOMAIN
+from homeassistant.util import dt as dt_util
+from aiohttp import ClientResponseError
+
+from .agur_client import AgurClient, AgurContract, AgurDataPoint, AgurInvoice, REQUESTS_PER_CONTRACT
+from .analytics import AgurConsumptionAnalytics
+from .const import DOMAIN, DEFAULT_MAX_CONCURRENT_CONTRACTS, DEFAULT_MIN_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL, \
+    STORAGE_VERSION, EVENT_CONSUMPTION_ANOMALY, metrics_signal, snapshot_storage_key
+from .history import AgurHistory
+from .metrics import AgurMetrics
+from .scheduler import AgurPollingScheduler, CADENCE_SAMPLES, async_get_fleet_scheduler
+from .series import AgurDataSeries
+from .statistics import AgurStatisticsBackfill, build_rollup_statistics, build_statistics, diff_statistics, \
+    read_statistics, reimport_start, rollup_reimport_start, rollup_statistic_id_for, statistic_id_for, \
+    statistic_metadata, ROLLUP_PERIODS, STATISTICS_REIMPORT_WINDOW
+from .token_manager import async_get_token_manager
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
-# TODO: This should be configurable?
+# Interval used until the cadence of the contracts is known
 SCAN_INTERVAL = timedelta(days=1)
+# How long the responses of the endpoints that change less often than the readings are reused
+CONTRACT_TTL = timedelta(days=7)
+INVOICES_TTL = timedelta(days=7)
+INVOICES_DUE_TTL = timedelta(hours=12)
+BALANCE_TTL = timedelta(hours=12)
+# Delay before writing the snapshot of the data to disk, so that several refreshes end up in a single write
+SNAPSHOT_SAVE_DELAY = 60
 
 
 class AgurDataUpdateCoordinatorData:
-    data_points: list[AgurDataPoint]
+    data_points: AgurDataSeries
     invoices: list[AgurInvoice]
     contract: AgurContract
     balance: float
+    changed_data_points: list[AgurDataPoint]
+    # Whether this data is the one from a previous refresh, because the last refresh of this contract failed
+    stale: bool = False
 
     def __init__(
             self,
-            data_points: list[AgurDataPoint],
+            data_points: AgurDataSeries,
             invoices: list[AgurInvoice],
             contract: AgurContract,
             balance: float,
+            changed_data_points: list[AgurDataPoint] | None = None,
     ):
-        # TODO: Sort from date descending
         self.data_points = data_points
+        # The readings that are new or changed since the previous refresh, most recent first
+        self.changed_data_points = changed_data_points if changed_data_points is not None else list(reversed(data_points))
         self.invoices = invoices
         self.contract = contract
         self.balance = balance
 
+    def with_stale(self, stale: bool) -> AgurDataUpdateCoordinatorData:
+        """Return this data, or a copy of it marked as `stale` if it is not, so that it differs from the previous one."""
+        if self.stale == stale:
+            return self
+        data = copy(self)
+        data.stale = stale
+        return data
+
     @property
     def last_index(self) -> AgurDataPoint | None:
-        return self.data_points[0] if len(self.data_points) > 0 else None
+        return self.data_points.latest
 
     @property
     def last_index_value(self) -> float | None:
-        return self.last_index.value if self.last_index is not None else None
+        return self.data_points.latest_value
 
     @property
     def last_index_date(self) -> datetime | None:
-        return self.last_index.date if self.last_index is not None else None
+        return self.data_points.latest_date
 
     @property
     def last_invoice(self) -> AgurInvoice | None:
@@ -78,100 +113,374 @@ class AgurDataUpdateCoordinator(DataUpdateCoordinator[dict[str, AgurDataUpdateCo
             username: str,
             password: str,
             contract_ids: list[str],
-            import_statistics: bool
+            import_statistics: bool,
+            max_concurrent_contracts: int = DEFAULT_MAX_CONCURRENT_CONTRACTS,
+            min_update_interval: timedelta = DEFAULT_MIN_UPDATE_INTERVAL,
+            max_update_interval: timedelta = DEFAULT_MAX_UPDATE_INTERVAL
     ) -> None:
         """Initialize."""
         self.platforms = []
-        self.expiration_date: datetime | None = None
-        self.session_token: datetime | None = None
-        self.auth_token: str | None = None
         self.username = username
-        self.password = password
+        self.token_manager = async_get_token_manager(hass, username, password)
         self.contract_ids = contract_ids
         self.import_statistics = import_statistics
-
-        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL)
+        self.max_concurrent_contracts = max_concurrent_contracts
+        self.fleet = async_get_fleet_scheduler(hass)
+        self.metrics = AgurMetrics()
+        self.client = AgurClient(
+            session=async_get_clientsession(hass),
+            rate_limiter=self.fleet.rate_limiter,
+            circuit_breaker=self.fleet.circuit_breaker,
+            metrics=self.metrics,
+            max_concurrent_requests=max_concurrent_contracts * REQUESTS_PER_CONTRACT
+        )
+        self.histories: dict[str, AgurHistory] = {}
+        # The consumption derived from the readings of each contract, updated with the new readings only
+        self.analytics: dict[str, AgurConsumptionAnalytics] = {}
+        # When each endpoint was last fetched for each contract, and the value it returned
+        self._endpoint_cache: dict[tuple[str, str], tuple[datetime, Any]] = {}
+        # The data of the last successful refresh, restored on startup while the first refresh runs in the background
+        self._snapshot_store = Store(hass, STORAGE_VERSION, snapshot_storage_key(username))
+        # The results of the last fetch of each contract, to tell whether anything changed
+        self._last_results: dict[str, tuple[Any, ...]] = {}
+        # The contracts whose data changed during the last refresh, so that only their entities write a new state
+        self.changed_contract_ids: set[str] = set()
+        # The contracts whose data became stale, or up to date again, without changing during the last refresh
+        self.stale_changed_contract_ids: set[str] = set()
+        # The statistics known to be in the recorder already
+        self._recorded_statistic_ids: set[str] = set()
+        # Imports the whole history of the statistics imported for the first time, in the background
+        self.backfill = AgurStatisticsBackfill(hass, username)
+        self.scheduler = AgurPollingScheduler(min_interval=min_update_interval, max_interval=max_update_interval)
+        # Number of statistics rows written to, and skipped because already in, the recorder during the last refresh
+        self.statistics_rows_written = 0
+        self.statistics_rows_skipped = 0
+
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_interval=min(max(SCAN_INTERVAL, min_update_interval), max_update_interval),
+            # Listeners are not notified when the data of all contracts is unchanged
+            always_update=False
+        )
 
     async def _async_update_data(self) -> dict[str, AgurDataUpdateCoordinatorData]:
         """Update data via library."""
-        # If we do not have any session token (first time)
-        if self.session_token is None or self.expiration_date is None:
-            _LOGGER.debug("First sync: fetching session token")
-            await self._async_get_session_token()
+        try:
+            with self.metrics.timer("phase.refresh"):
+                return await self._async_refresh_data()
+        finally:
+            # The instrumentation changes on every refresh, even when the listeners are not notified because the data
+            # did not change
+            async_dispatcher_send(self.hass, metrics_signal(self.username))
+
+    async def _async_refresh_data(self) -> dict[str, AgurDataUpdateCoordinatorData]:
+        self.statistics_rows_written = 0
+        self.statistics_rows_skipped = 0
+        self.changed_contract_ids = set()
+        self.stale_changed_contract_ids = set()
 
         try:
-            # If we do not have any auth token (first time)
-            if self.auth_token is None:
-                _LOGGER.debug("First sync: fetching auth token")
-                await self._async_get_auth_token()
-
-            # If the session token is expired, retrieve one
-            if datetime.now().replace(tzinfo=self.expiration_date.tzinfo) > self.expiration_date:
-                _LOGGER.debug("Session token expired: fetching a new one")
-                await self._async_refresh_tokens()
-
-            data: dict[str, AgurDataUpdateCoordinatorData] = {}
-            for contract_id in self.contract_ids:
-                _LOGGER.debug(f"Fetching details and history for contract '{contract_id}'")
+            with self.metrics.timer("phase.tokens"):
+                await self._async_ensure_tokens()
+
+            try:
+                with self.metrics.timer("phase.contracts"):
+                    data = await self._async_fetch_contracts()
+            except ClientResponseError as exception:
+                if exception.status != 401:
+                    raise exception
+                # The tokens might have been revoked before their expiration date, e.g. when restored from the store
+                with self.metrics.timer("phase.tokens"):
+                    await self._async_ensure_tokens(rejected_auth_token=self.client.auth_token)
+                with self.metrics.timer("phase.contracts"):
+                    data = await self._async_fetch_contracts()
+
+        except ClientResponseError as exception:
+            if exception.status == 401:
+                raise ConfigEntryAuthFailed(f"Invalid credentials for Agur account {self.username}")
+            raise UpdateFailed(f"Error communicating with API: {exception}")
+        except Exception as exception:
+            raise UpdateFailed(f"Error communicating with API: {exception}")
+
+        # Statistics are imported once all contracts are fetched, so that the recorder is queried only once
+        try:
+            with self.metrics.timer("phase.statistics"):
+                await self._handle_statistics(data=data)
+        except Exception as exception:
+            _LOGGER.error(f"Failed to import statistics: {exception}")
+        self.metrics.increment("recorder_rows_written", self.statistics_rows_written)
+        self.metrics.increment("recorder_rows_skipped", self.statistics_rows_skipped)
+
+        now = dt_util.now()
+        for contract_id, coordinator_data in data.items():
+            if not coordinator_data.stale:
+                self.scheduler.update(contract_id, coordinator_data.data_points, coordinator_data.invoices, now)
+        self.update_interval = self.fleet.schedule(self, self.scheduler.next_interval(now))
+        _LOGGER.debug(f"Next refresh in {self.update_interval}")
+
+        for contract_id in self.changed_contract_ids:
+            coordinator_data = data[contract_id]
+            cadence = self.scheduler.cadences.get(contract_id)
+            analytics = await self._async_get_analytics(contract_id=contract_id)
+            analytics.update(
+                series=coordinator_data.data_points,
+                changed_data_points=coordinator_data.changed_data_points,
+                invoices=coordinator_data.invoices,
+                invoice_interval=cadence.invoice_interval if cadence is not None else None
+            )
+            for anomaly in analytics.anomalies:
+                _LOGGER.warning(
+                    f"Unusual consumption ({anomaly['type']}) on {anomaly['date']} for contract '{contract_id}'"
+                )
+                self.hass.bus.async_fire(EVENT_CONSUMPTION_ANOMALY, {"contract_id": contract_id, **anomaly})
+
+        if len(self.changed_contract_ids) > 0:
+            self._snapshot_store.async_delay_save(self._snapshot_data_to_save, SNAPSHOT_SAVE_DELAY)
+
+        return data
+
+    async def async_restore_snapshot(self) -> bool:
+        """
+        Restore the data of the last successful refresh saved on disk, if any, without any call to the API.
+
+        Returns whether the data of every contract was restored, in which case the entities can be set up right away.
+        """
+        stored = await self._snapshot_store.async_load()
+        if not stored:
+            return False
+
+        data: dict[str, AgurDataUpdateCoordinatorData] = {}
+        for contract_id in self.contract_ids:
+            snapshot = stored.get("contracts", {}).get(contract_id)
+            if snapshot is None:
+                continue
+
+            try:
+                history = await self._async_get_history(contract_id=contract_id)
+                await self._async_get_analytics(contract_id=contract_id)
+                contract = AgurContract(json=snapshot["contract"])
+                invoices = [AgurInvoice(json=json) for json in snapshot["invoices"]]
+                balance = snapshot["balance"]
+                fetched_at = {endpoint: datetime.fromisoformat(date) for endpoint, date in snapshot["fetched_at"].items()}
+            except (KeyError, TypeError, ValueError) as exception:
+                _LOGGER.debug(f"Ignoring invalid snapshot for contract '{contract_id}': {exception}")
+                continue
+
+            # Reuse the restored responses until they are due, like if they had been fetched by this instance
+            for endpoint, value in (("contract", contract), ("invoices", invoices), ("balance", balance)):
+                if endpoint in fetched_at:
+                    self._endpoint_cache[(contract_id, endpoint)] = (fetched_at[endpoint], value)
+
+            data[contract_id] = AgurDataUpdateCoordinatorData(
+                data_points=history.data_points,
+                invoices=invoices,
+                contract=contract,
+                balance=balance,
+                changed_data_points=[],
+            )
+            # Until it is refreshed, the restored data is the one of a previous refresh
+            data[contract_id].stale = True
+
+        missing = [contract_id for contract_id in self.contract_ids if contract_id not in data]
+        if len(missing) > 0:
+            # e.g. a contract was just added to the options: without its data, its entities could not be set up
+            _LOGGER.debug(f"No snapshot for contracts {missing} of Agur account {self.username}")
+            return False
+
+        _LOGGER.debug(f"Restored the data of {len(data)} contracts for Agur account {self.username}")
+        self.data = data
+        return True
+
+    async def async_background_refresh(self) -> None:
+        """Refresh the restored data, after a random delay so that all accounts do not refresh at once on startup."""
+        await asyncio.sleep(self.fleet.startup_delay())
+        await self.async_refresh()
+
+    def _snapshot_data_to_save(self) -> dict[str, Any]:
+        contracts = {}
+        for contract_id, coordinator_data in (self.data or {}).items():
+            contracts[contract_id] = {
+                "contract": coordinator_data.contract.to_json(),
+                "invoices": [invoice.to_json() for invoice in coordinator_data.invoices],
+                "balance": coordinator_data.balance,
+                "fetched_at": {
+                    endpoint: self._endpoint_cache[(contract_id, endpoint)][0].isoformat()
+                    for endpoint in ("contract", "invoices", "balance")
+                    if (contract_id, endpoint) in self._endpoint_cache
+                },
+            }
+        return {"contracts": contracts}
+
+    async def _async_ensure_tokens(self, rejected_auth_token: str | None = None) -> None:
+        self.client.session_token, self.client.auth_token = await self.token_manager.async_get_tokens(
+            rejected_auth_token=rejected_auth_token
+        )
+
+    async def _async_fetch_contracts(self) -> dict[str, AgurDataUpdateCoordinatorData]:
+        # All contracts are fetched concurrently, up to `max_concurrent_contracts` at a time, and collected as they
+        # finish. A contract that fails keeps its previous data, marked as stale, so it does not fail the others.
+        semaphore = asyncio.Semaphore(self.max_concurrent_contracts)
+        tasks = [
+            asyncio.create_task(self._async_fetch_contract(contract_id=contract_id, semaphore=semaphore))
+            for contract_id in self.contract_ids
+        ]
+
+        data: dict[str, AgurDataUpdateCoordinatorData] = {}
+        errors: list[Exception] = []
+        for task in asyncio.as_completed(tasks):
+            contract_id, result = await task
+            previous = self.data.get(contract_id) if self.data is not None else None
+            if not isinstance(result, Exception):
+                if result is previous and previous.stale:
+                    self.stale_changed_contract_ids.add(contract_id)
+                    result = previous.with_stale(False)
+                data[contract_id] = result
+                continue
+
+            if isinstance(result, ClientResponseError) and result.status == 401:
+                for other_task in tasks:
+                    other_task.cancel()
+                raise result
+
+            errors.append(result)
+            if previous is not None:
+                _LOGGER.warning(f"Failed to refresh contract '{contract_id}', keeping previous data: {result}")
+                if not previous.stale:
+                    self.stale_changed_contract_ids.add(contract_id)
+                data[contract_id] = previous.with_stale(True)
+            else:
+                _LOGGER.warning(f"Failed to fetch contract '{contract_id}': {result}")
+
+        if errors and not data:
+            raise errors[0]
+
+        return data
+
+    async def _async_fetch_contract(
+            self,
+            contract_id: str,
+            semaphore: asyncio.Semaphore
+    ) -> tuple[str, AgurDataUpdateCoordinatorData | Exception]:
+        async with semaphore:
+            _LOGGER.debug(f"Fetching details and history for contract '{contract_id}'")
+            try:
+                history = await self._async_get_history(contract_id=contract_id)
+                # Wait for all the requests even if one fails: the ones that succeeded are cached, so that only the
+                # failed ones are requested again on the next refresh
                 results = await asyncio.gather(
-                    self._async_get_data_points(contract_id=contract_id),
+                    self._async_get_data_points(contract_id=contract_id, since=history.fetch_since),
                     self._async_get_invoices(contract_id=contract_id),
                     self._async_get_contract(contract_id=contract_id),
                     self._async_get_balance(contract_id=contract_id),
+                    return_exceptions=True
                 )
-                data[contract_id] = AgurDataUpdateCoordinatorData(
-                    data_points=results[0],
-                    invoices=results[1],
-                    contract=results[2],
-                    balance=results[3],
-                )
-
-                await self._handle_statistics(coordinator_data=data[contract_id])
-
-            return data
-
-        except HTTPError as exception:
-            if exception.response.status_code == 401:
-                raise ConfigEntryAuthFailed(f"Invalid credentials for Agur account {self.username}")
-            raise exception
-        except Exception as exception:
-            raise UpdateFailed(f"Error communicating with API: {exception}")
+            except Exception as exception:
+                return contract_id, exception
+
+            for result in results:
+                if isinstance(result, Exception):
+                    return contract_id, result
+
+            # The client returns the very same objects when the responses did not change, in which case there is
+            # nothing to merge, import or update for this contract
+            previous = self.data.get(contract_id) if self.data is not None else None
+            previous_results = self._last_results.get(contract_id)
+            self._last_results[contract_id] = tuple(results)
+            if (
+                    previous is not None
+                    and previous_results is not None
+                    and all(result is previous_result for result, previous_result in zip(results, previous_results))
+            ):
+                _LOGGER.debug(f"No change for contract '{contract_id}'")
+                previous.changed_data_points = []
+                return contract_id, previous
+
+            count = len(history.data_points)
+            changed_data_points = history.merge(results[0])
+            _LOGGER.debug(f"Found {len(changed_data_points)} new or changed readings for contract '{contract_id}'")
+            # The readings are parsed again when they are fetched from another date, e.g. on the refresh after the
+            # first one or after a restart, without being any different from the ones already known
+            if (
+                    previous is not None
+                    and len(changed_data_points) == 0
+                    and len(history.data_points) == count
+                    and results[1] is previous.invoices
+                    and results[2] is previous.contract
+                    and results[3] is previous.balance
+            ):
+                _LOGGER.debug(f"No change for contract '{contract_id}'")
+                previous.changed_data_points = []
+                return contract_id, previous
+
+            coordinator_data = AgurDataUpdateCoordinatorData(
+                data_points=history.data_points,
+                invoices=results[1],
+                contract=results[2],
+                balance=results[3],
+                changed_data_points=changed_data_points,
+            )
 
-    async def _async_get_session_token(self) -> None:
-        client = AgurClient()
-        response = await self.hass.async_add_executor_job(client.init)
-        self.session_token = response["token"]
-        self.expiration_date = datetime.fromisoformat(response["expirationDate"])
+            self.changed_contract_ids.add(contract_id)
+            return contract_id, coordinator_data
 
-    async def _async_get_auth_token(self) -> None:
-        client = AgurClient(session_token=self.session_token)
-        response = await self.hass.async_add_executor_job(client.login, self.username, self.password)
-        self.auth_token = response["tokenAuthentique"]
+    async def _async_get_history(self, contract_id) -> AgurHistory:
+        if contract_id not in self.histories:
+            self.histories[contract_id] = AgurHistory(self.hass, contract_id)
+        history = self.histories[contract_id]
+        await history.async_load()
+        return history
 
-    async def _async_refresh_tokens(self) -> None:
-        await self._async_get_session_token()
-        await self._async_get_auth_token()
+    async def _async_get_analytics(self, contract_id) -> AgurConsumptionAnalytics:
+        if contract_id not in self.analytics:
+            self.analytics[contract_id] = AgurConsumptionAnalytics(self.hass, contract_id)
+        analytics = self.analytics[contract_id]
+        await analytics.async_load()
+        return analytics
 
-    async def _async_get_data_points(self, contract_id) -> list[AgurDataPoint]:
-        client = AgurClient(session_token=self.session_token, auth_token=self.auth_token)
-        return await self.hass.async_add_executor_job(client.get_data, contract_id)
+    async def _async_get_data_points(self, contract_id, since: datetime | None = None) -> list[AgurDataPoint]:
+        return await self.client.get_data(contract_id, since=since)
 
     async def _async_get_invoices(self, contract_id) -> list[AgurInvoice]:
-        client = AgurClient(session_token=self.session_token, auth_token=self.auth_token)
-        return await self.hass.async_add_executor_job(client.get_invoices, contract_id)
+        cadence = self.scheduler.cadences.get(contract_id)
+        # Invoices only change once per billing period, so they are kept longer while the next one is not expected
+        if cadence is not None and not cadence.is_invoice_due(dt_util.now()):
+            ttl = INVOICES_TTL
+        else:
+            ttl = INVOICES_DUE_TTL
+        # Only the most recent invoices are needed, for the sensor and to learn the invoice cadence
+        return await self._async_get_cached(
+            contract_id,
+            "invoices",
+            ttl,
+            lambda contract_id_: self.client.get_invoices(contract_id_, limit=CADENCE_SAMPLES + 1)
+        )
 
     async def _async_get_contract(self, contract_id) -> AgurContract:
-        client = AgurClient(session_token=self.session_token, auth_token=self.auth_token)
-        return await self.hass.async_add_executor_job(client.get_contract, contract_id)
+        return await self._async_get_cached(contract_id, "contract", CONTRACT_TTL, self.client.get_contract)
 
     async def _async_get_balance(self, contract_id) -> float:
-        client = AgurClient(session_token=self.session_token, auth_token=self.auth_token)
-        return await self.hass.async_add_executor_job(client.get_balance, contract_id)
-
-    async def _handle_statistics(self, coordinator_data: AgurDataUpdateCoordinatorData) -> None:
-        statistic_id = f"{DOMAIN}:water_consumption_{coordinator_data.contract.id}"
-        recorder = get_instance(self.hass)
+        return await self._async_get_cached(contract_id, "balance", BALANCE_TTL, self.client.get_balance)
 
+    async def _async_get_cached(
+            self,
+            contract_id: str,
+            endpoint: str,
+            ttl: timedelta,
+            fetch: Callable[[str], Awaitable[Any]]
+    ) -> Any:
+        """Return the cached value of an endpoint for a contract, or fetch it if it is older than `ttl`."""
+        now = dt_util.utcnow()
+        cached = self._endpoint_cache.get((contract_id, endpoint))
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+
+        value = await fetch(contract_id)
+        self._endpoint_cache[(contract_id, endpoint)] = (now, value)
+        return value
+
+    async def _handle_statistics(self, data: dict[str, AgurDataUpdateCoordinatorData]) -> None:
         if self.import_statistics is False:
             # TODO: We might want to purge the statistics here. Although still TBD
             return
@@ -184,51 +493,125 @@ class AgurDataUpdateCoordinator(DataUpdateCoordinator[dict[str, AgurDataUpdateCo
         # Another solution would be to use a sensor for this using the following library:
         # https://github.com/ldotlopez/ha-historical-sensor
 
-        daily_indexes_data = coordinator_data.data_points
-        last_stats = await recorder.async_add_executor_job(
-            get_last_statistics,
+        # Contracts kept from a previous refresh, or without any change to statistics already imported, have nothing
+        # new to import
+        contracts_data = {
+            contract_id: coordinator_data
+            for contract_id, coordinator_data in data.items()
+            if not coordinator_data.stale
+            and len(coordinator_data.data_points) > 0
+            and (
+                    len(coordinator_data.changed_data_points) > 0
+                    or statistic_id_for(contract_id) not in self._recorded_statistic_ids
+            )
+        }
+        if len(contracts_data) == 0:
+            return
+
+        # We want to reimport the last 30 days of data for each contract, just in case there are some corrections that
+        # need to be done. The recorded rows of all contracts are read at once, from the earliest of these windows,
+        # including the row of the reading before each window, whose sum the statistics of the window carry on from.
+        window_start = min(
+            reimport_start(coordinator_data.data_points) for coordinator_data in contracts_data.values()
+        )
+        starts = {statistic_id_for(contract_id): window_start for contract_id in contracts_data}
+        # The rollups are imported again from the period of the earliest changed reading, which can start before the
+        # reimport window, e.g. on January 1st for the yearly one. Likewise, their sums carry on from the period before.
+        for period, (_, period_start) in ROLLUP_PERIODS.items():
+            rollup_start = min([
+                window_start,
+                *(
+                    rollup_reimport_start(
+                        coordinator_data.data_points,
+                        period_start,
+                        coordinator_data.changed_data_points[-1].date
+                    )
+                    for coordinator_data in contracts_data.values()
+                    if len(coordinator_data.changed_data_points) > 0
+                )
+            ])
+            starts.update({rollup_statistic_id_for(contract_id, period): rollup_start for contract_id in contracts_data})
+        recorder = get_instance(self.hass)
+        existing_statistic_ids, existing_rows = await recorder.async_add_executor_job(
+            read_statistics,
             self.hass,
-            1,
-            statistic_id,
-            True,
-            set("sum")
+            starts
         )
+        self._recorded_statistic_ids.update(existing_statistic_ids)
+        await self.backfill.async_load()
 
-        if not last_stats:
-            # If the statistic does not exist, it means we are importing it for the first time, i.e. we import the
-            # entire set of `daily_index_data`
-            min_start = None
-        else:
-            # Otherwise, we want to reimport the last 30 days of data, just in case there are some corrections that
-            # need to be done
-            # `daily_index_data[0]` is the most recent data point, so we get that date and subtract 30 days.
-            min_start = daily_indexes_data[0].date - timedelta(days=30)
+        for contract_id, coordinator_data in contracts_data.items():
+            statistic_id = statistic_id_for(contract_id)
+            daily_indexes_data = coordinator_data.data_points
 
-        statistics = []
+            self._handle_rollup_statistics(contract_id, coordinator_data, existing_statistic_ids, existing_rows)
+
+            if statistic_id not in existing_statistic_ids:
+                # If the statistic does not exist, it means we are importing it for the first time, i.e. we import the
+                # entire set of `daily_index_data`. This is done in chunks, in the background, to not hold the refresh.
+                if not self.backfill.is_queued(statistic_id):
+                    self.backfill.schedule(statistic_id, daily_indexes_data, restart=True)
+                continue
+            if not self.backfill.is_complete(statistic_id):
+                # The import of the whole history also imports the latest readings, once it resumes
+                self.backfill.schedule(statistic_id, daily_indexes_data, restart=False)
+                continue
+            if len(coordinator_data.changed_data_points) == 0:
+                # The statistics already exist and no reading changed since they were imported
+                continue
 
-        for index, daily_index_data in enumerate(list(reversed(daily_indexes_data))):
-            _start = daily_index_data.date
-            if min_start is not None and _start <= min_start:
+            min_start = daily_indexes_data.latest_date - STATISTICS_REIMPORT_WINDOW
+            statistics = build_statistics(
+                series=daily_indexes_data,
+                min_start=min_start,
+                existing_rows=existing_rows.get(statistic_id, [])
+            )
+            # Only submit the rows that are new or changed compared to what the recorder already has
+            changed_statistics = diff_statistics(statistics, existing_rows.get(statistic_id, []))
+
+            self.statistics_rows_written += len(changed_statistics)
+            self.statistics_rows_skipped += len(statistics) - len(changed_statistics)
+            _LOGGER.debug(
+                f"Statistics for '{statistic_id}': {len(changed_statistics)} rows written, "
+                f"{len(statistics) - len(changed_statistics)} rows unchanged"
+            )
+            if len(changed_statistics) == 0:
                 continue
 
-            _state = daily_index_data.value - daily_indexes_data[index - 1].value if index > 0 else 0
-            _sum = daily_index_data.value
+            async_add_external_statistics(self.hass, statistic_metadata(statistic_id), changed_statistics)
+            self._recorded_statistic_ids.add(statistic_id)
 
-            statistics.append(
-                StatisticData(
-                    start=_start.replace(minute=0, second=0, microsecond=0),
-                    state=_state,
-                    sum=_sum,
-                )
+    def _handle_rollup_statistics(
+            self,
+            contract_id: str,
+            coordinator_data: AgurDataUpdateCoordinatorData,
+            existing_statistic_ids: set[str],
+            existing_rows: dict[str, list[dict[str, Any]]]
+    ) -> None:
+        """Import the monthly and yearly consumption of the periods touched by the readings changed since last time."""
+        for period, (name, period_start) in ROLLUP_PERIODS.items():
+            statistic_id = rollup_statistic_id_for(contract_id, period)
+
+            if statistic_id not in existing_statistic_ids:
+                # A few dozen rows at most, which are imported at once
+                since = None
+            elif len(coordinator_data.changed_data_points) == 0:
+                continue
+            else:
+                # The changed readings are the most recent first
+                since = coordinator_data.changed_data_points[-1].date
+
+            statistics = build_rollup_statistics(
+                series=coordinator_data.data_points,
+                period_start=period_start,
+                since=since,
+                existing_rows=existing_rows.get(statistic_id, [])
             )
+            changed_statistics = diff_statistics(statistics, existing_rows.get(statistic_id, []))
+            self.statistics_rows_written += len(changed_statistics)
+            self.statistics_rows_skipped += len(statistics) - len(changed_statistics)
+            if len(changed_statistics) == 0:
+                continue
 
-        unit = UnitOfVolume.LITERS
-        metadata = StatisticMetaData(
-            has_mean=False,
-            has_sum=True,
-            name=f"Water consumption",
-            source=DOMAIN,
-            statistic_id=statistic_id,
-            unit_of_measurement=unit,
-        )
-        async_add_external_statistics(self.hass, metadata, statistics)
+            async_add_external_statistics(self.hass, statistic_metadata(statistic_id, name), changed_statistics)
+            self._recorded_statistic_ids.add(statistic_id)
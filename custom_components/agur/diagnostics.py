@@ -0,0 +1,43 @@
+"""Diagnostics support for Agur."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD
+from .coordinator import AgurDataUpdateCoordinator
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD, "contract_owner", "contract_address"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, config_entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: AgurDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
+
+    return {
+        "entry": async_redact_data(
+            {"data": dict(config_entry.data), "options": dict(config_entry.options)},
+            TO_REDACT
+        ),
+        "refresh": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": str(coordinator.update_interval),
+            "statistics_rows_written": coordinator.statistics_rows_written,
+            "statistics_rows_skipped": coordinator.statistics_rows_skipped,
+            "circuit_breaker_open": coordinator.fleet.circuit_breaker.is_open,
+        },
+        "contracts": {
+            contract_id: {
+                "stale": contract_data.stale,
+                "data_points": len(contract_data.data_points),
+                "last_index_date": contract_data.last_index_date,
+                "invoices": len(contract_data.invoices),
+            }
+            for contract_id, contract_data in (coordinator.data or {}).items()
+        },
+        "statistics_backfill": coordinator.backfill.as_dict(),
+        "metrics": coordinator.metrics.as_dict(),
+    }
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from itertools import islice, takewhile
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .agur_client import AgurDataPoint
+from .const import STORAGE_VERSION, history_storage_key
+from .series import AgurDataSeries
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+# How far back, from the most recent known reading, readings are fetched again in case they were corrected
+HISTORY_CORRECTION_WINDOW = timedelta(days=30)
+# Delay before writing the history to disk, so that several changes end up in a single write
+HISTORY_SAVE_DELAY = 60
+
+
+class AgurHistory:
+    """Class to keep the index readings of a contract, persisted on disk across restarts."""
+
+    def __init__(self, hass: HomeAssistant, contract_id: str) -> None:
+        """Initialize."""
+        self.contract_id = contract_id
+        self.data_points = AgurDataSeries()
+        self._store = Store(hass, STORAGE_VERSION, history_storage_key(contract_id))
+        self._loaded = False
+
+    @property
+    def last_date(self) -> datetime | None:
+        return self.data_points.latest_date
+
+    @property
+    def fetch_since(self) -> datetime | None:
+        """Return the date from which readings need to be fetched, or `None` if the whole history is needed."""
+        return self.last_date - HISTORY_CORRECTION_WINDOW if self.last_date is not None else None
+
+    async def async_load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+
+        stored = await self._store.async_load()
+        if not stored:
+            return
+
+        self.data_points = AgurDataSeries(
+            sorted(
+                (AgurDataPoint(json=json) for json in stored.get("data_points", [])),
+                key=lambda data_point: data_point.date
+            )
+        )
+        _LOGGER.debug(f"Restored {len(self.data_points)} readings for contract '{self.contract_id}'")
+
+    async def async_remove(self) -> None:
+        self.data_points = AgurDataSeries()
+        await self._store.async_remove()
+
+    def merge(self, data_points: list[AgurDataPoint]) -> list[AgurDataPoint]:
+        """
+        Merge freshly fetched readings, sorted from date descending, into the history.
+
+        The fresh readings only need to cover the most recent part of the history: the known readings within the same
+        date range are replaced by them. Returns the new or changed readings, sorted from date descending, i.e. all the
+        fresh readings from the first one that differs from the known readings, in order.
+        """
+        if len(data_points) == 0:
+            return []
+
+        series = self.data_points
+        start = series.bisect(data_points[-1].date)
+        # Both are compared in order, as several readings can share a date, e.g. on a meter replacement
+        known = zip(islice(series.timestamps, start, None), islice(series.values, start, None))
+        fresh = ((data_point.date.timestamp(), data_point.value) for data_point in reversed(data_points))
+        unchanged = sum(1 for _ in takewhile(lambda pair: pair[0] == pair[1], zip(known, fresh)))
+        changes = data_points[:len(data_points) - unchanged]
+
+        if len(changes) > 0 or len(series) - start != len(data_points):
+            series.truncate(start)
+            series.extend(reversed(data_points))
+            self._store.async_delay_save(self._data_to_save, HISTORY_SAVE_DELAY)
+
+        return changes
+
+    def _data_to_save(self) -> dict[str, Any]:
+        return {
+            "data_points": [
+                {"dateReleve": data_point.date.isoformat(), "valeurIndex": data_point.value}
+                for data_point in reversed(self.data_points)
+            ]
+        }
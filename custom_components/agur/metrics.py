@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any
+
+# Upper bounds of the buckets of the timing histograms, in milliseconds
+HISTOGRAM_BUCKETS: tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class AgurHistogram:
+    """Fixed-bucket histogram of durations, cheap enough to record every request."""
+
+    __slots__ = ("count", "total", "max", "last", "buckets")
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        # One more bucket for the durations above the last bound
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    def record(self, milliseconds: float) -> None:
+        self.count += 1
+        self.total += milliseconds
+        self.last = milliseconds
+        if milliseconds > self.max:
+            self.max = milliseconds
+        self.buckets[bisect_left(HISTOGRAM_BUCKETS, milliseconds)] += 1
+
+    def percentile(self, ratio: float) -> float | None:
+        """Return the upper bound of the bucket holding the given percentile, e.g. `0.95`."""
+        if self.count == 0:
+            return None
+        rank = ratio * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return HISTOGRAM_BUCKETS[index] if index < len(HISTOGRAM_BUCKETS) else self.max
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 1) if self.count > 0 else None,
+            "last_ms": round(self.last, 1),
+            "max_ms": round(self.max, 1),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "buckets": {
+                f"<={bound}" if index < len(HISTOGRAM_BUCKETS) else f">{HISTOGRAM_BUCKETS[-1]}": count
+                for index, (bound, count) in enumerate(zip(HISTOGRAM_BUCKETS + (None,), self.buckets))
+                if count > 0
+            },
+        }
+
+
+class AgurMetrics:
+    """Timings and counters of the calls to the Agur API and of the refresh phases of an account."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.timings: dict[str, AgurHistogram] = {}
+        self.counters: Counter[str] = Counter()
+
+    def record_time(self, name: str, seconds: float) -> None:
+        histogram = self.timings.get(name)
+        if histogram is None:
+            histogram = self.timings[name] = AgurHistogram()
+        histogram.record(seconds * 1000)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def last_time(self, name: str) -> float | None:
+        """Return the last duration recorded under `name`, in milliseconds."""
+        histogram = self.timings.get(name)
+        return round(histogram.last, 1) if histogram is not None else None
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(name, perf_counter() - start)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "timings": {name: histogram.as_dict() for name, histogram in sorted(self.timings.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from statistics import median
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .agur_client import AgurCircuitBreaker, AgurInvoice, AgurRateLimiter
+from .const import DOMAIN, DATA_FLEET_SCHEDULER
+from .series import AgurDataSeries
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+# Number of most recent intervals used to learn the cadence of readings and invoices
+CADENCE_SAMPLES = 10
+# Weight of a new observation in the moving average of the delay between a reading and its publication by the API
+PUBLICATION_DELAY_WEIGHT = 0.3
+# Requests per second sent to the Agur API on average, by all accounts together, and the size of the bursts allowed
+API_RATE_LIMIT = 5.0
+API_RATE_BURST = 10
+# Refreshes are moved earlier than planned by up to this fraction of their interval, and at most by `MAX_JITTER`, so
+# that accounts do not all refresh at the same time
+JITTER_RATIO = 0.1
+MAX_JITTER = timedelta(minutes=30)
+# Minimum time between the refreshes of two accounts, as long as the jitter window allows it
+REFRESH_SPACING = timedelta(seconds=30)
+# Maximum delay before the first refresh of an account whose data was restored on startup
+STARTUP_JITTER = timedelta(minutes=1)
+
+
+def as_aware(date: datetime) -> datetime:
+    """Return the date, in the local timezone if it has none."""
+    return date if date.tzinfo is not None else dt_util.as_local(date)
+
+
+@callback
+def async_get_fleet_scheduler(hass: HomeAssistant) -> AgurFleetScheduler:
+    """Return the scheduler shared by all the Agur accounts."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_FLEET_SCHEDULER not in domain_data:
+        domain_data[DATA_FLEET_SCHEDULER] = AgurFleetScheduler()
+    return domain_data[DATA_FLEET_SCHEDULER]
+
+
+class AgurContractCadence:
+    """Class to learn when new readings and invoices of a contract are expected to be published."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.reading_interval: timedelta | None = None
+        self.invoice_interval: timedelta | None = None
+        self.last_reading_date: datetime | None = None
+        self.last_invoice_date: datetime | None = None
+        # How long after its date a reading shows up in the API, learned from the refreshes that found new readings
+        self.publication_delay = timedelta()
+
+    def update(self, data_points: AgurDataSeries, invoices: list[AgurInvoice], now: datetime) -> None:
+        timestamps = data_points.timestamps[-(CADENCE_SAMPLES + 1):]
+        if len(timestamps) > 1:
+            self.reading_interval = timedelta(seconds=median(b - a for a, b in zip(timestamps, timestamps[1:])))
+
+        latest_date = as_aware(data_points.latest_date) if len(data_points) > 0 else None
+        if latest_date is not None and latest_date != self.last_reading_date:
+            if self.last_reading_date is not None:
+                # A new reading showed up since the previous refresh, so its publication delay is at most this
+                delay = now - latest_date
+                self.publication_delay = (
+                        self.publication_delay * (1 - PUBLICATION_DELAY_WEIGHT) + delay * PUBLICATION_DELAY_WEIGHT
+                )
+            self.last_reading_date = latest_date
+
+        issue_dates = sorted(as_aware(invoice.issue_date) for invoice in invoices if invoice.issue_date is not None)
+        issue_dates = issue_dates[-(CADENCE_SAMPLES + 1):]
+        if len(issue_dates) > 1:
+            self.invoice_interval = median(b - a for a, b in zip(issue_dates, issue_dates[1:]))
+        if len(issue_dates) > 0:
+            self.last_invoice_date = issue_dates[-1]
+
+    def is_invoice_due(self, now: datetime) -> bool:
+        """Return whether a new invoice is expected, or if it cannot be told yet."""
+        if self.last_invoice_date is None or self.invoice_interval is None:
+            return True
+        return now >= self.last_invoice_date + self.invoice_interval
+
+    def expected_dates(self) -> list[tuple[datetime, timedelta]]:
+        """Return when the next reading and invoice are expected to be published, along with their cadence."""
+        expected = []
+        if self.last_reading_date is not None and self.reading_interval is not None:
+            expected.append((
+                self.last_reading_date + self.reading_interval + self.publication_delay,
+                self.reading_interval
+            ))
+        if self.last_invoice_date is not None and self.invoice_interval is not None:
+            expected.append((self.last_invoice_date + self.invoice_interval, self.invoice_interval))
+        return expected
+
+
+class AgurPollingScheduler:
+    """
+    Class to pick the interval until the next refresh, from the cadence observed for each contract.
+
+    The coordinator polls every `min_interval` from the time new data is expected until it shows up, and sleeps until
+    the next expected time otherwise, within `max_interval`.
+    """
+
+    def __init__(self, min_interval: timedelta, max_interval: timedelta) -> None:
+        """Initialize."""
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.cadences: dict[str, AgurContractCadence] = {}
+
+    def update(self, contract_id: str, data_points: AgurDataSeries, invoices: list[AgurInvoice], now: datetime) -> None:
+        if contract_id not in self.cadences:
+            self.cadences[contract_id] = AgurContractCadence()
+        self.cadences[contract_id].update(data_points, invoices, now)
+
+    def next_interval(self, now: datetime) -> timedelta:
+        interval = self.max_interval
+        for cadence in self.cadences.values():
+            for expected_date, period in cadence.expected_dates():
+                wait = expected_date - now
+                if wait <= timedelta() and -wait < period:
+                    # The data is due and has not shown up yet: poll often until it does
+                    return self.min_interval
+                if wait > timedelta():
+                    interval = min(interval, wait)
+
+        return max(self.min_interval, interval)
+
+
+class AgurFleetScheduler:
+    """
+    Class to coordinate the refreshes of all the Agur accounts.
+
+    It holds the rate limiter and the circuit breaker shared by all the requests to the Agur API, and spreads the refreshes of the registered
+    coordinators so that they do not hit the API at the same time. A refresh is only ever moved earlier, never later
+    than the interval its coordinator asked for.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.rate_limiter = AgurRateLimiter(rate=API_RATE_LIMIT, burst=API_RATE_BURST)
+        self.circuit_breaker = AgurCircuitBreaker()
+        # The monotonic time of the next refresh of each registered coordinator
+        self._planned: dict[object, float] = {}
+
+    def register(self, coordinator: object) -> None:
+        self._planned.setdefault(coordinator, 0.0)
+
+    def unregister(self, coordinator: object) -> None:
+        self._planned.pop(coordinator, None)
+
+    def startup_delay(self) -> float:
+        """Return how long to wait, in seconds, before the first refresh of an account on startup."""
+        return random.uniform(0, STARTUP_JITTER.total_seconds())
+
+    def schedule(self, coordinator: object, interval: timedelta) -> timedelta:
+        """Return the interval after which the coordinator should refresh, at most `interval`."""
+        now = time.monotonic()
+        deadline = now + interval.total_seconds()
+        window = min(interval.total_seconds() * JITTER_RATIO, MAX_JITTER.total_seconds())
+        earliest = deadline - window
+
+        planned = deadline - random.uniform(0, window)
+        spacing = REFRESH_SPACING.total_seconds()
+        for other in sorted(
+                (planned_at for other, planned_at in self._planned.items() if other is not coordinator),
+                reverse=True
+        ):
+            if abs(other - planned) < spacing and other - spacing >= earliest:
+                planned = other - spacing
+        planned = max(planned, earliest)
+
+        if coordinator in self._planned:
+            self._planned[coordinator] = planned
+        return timedelta(seconds=planned - now)
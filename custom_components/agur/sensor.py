@@ -2,18 +2,21 @@
 from __future__ import annotations
 
 import logging
+from typing import Any
 
 from homeassistant.components.sensor import SensorEntity, SensorStateClass, SensorDeviceClass, SensorEntityDescription
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import UnitOfVolume, CURRENCY_EURO
-from homeassistant.core import HomeAssistant
+from homeassistant.const import UnitOfVolume, CURRENCY_EURO, UnitOfTime, EntityCategory
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import slugify
 
 from .const import DOMAIN
-from .const import SENSOR_PLATFORM
-from .coordinator import AgurDataUpdateCoordinator
+from .const import SENSOR_PLATFORM, metrics_signal
+from .coordinator import AgurDataUpdateCoordinator, AgurDataUpdateCoordinatorData
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
@@ -44,12 +47,96 @@ SENSORS: tuple[SensorEntityDescription, ...] = (
     ),
 )
 
+# Consumption derived from the readings of each contract
+ANALYTICS_SENSORS: tuple[SensorEntityDescription, ...] = (
+    SensorEntityDescription(
+        key="last_consumption",
+        translation_key="last_consumption",
+        icon="mdi:water",
+        device_class=SensorDeviceClass.WATER,
+        native_unit_of_measurement=UnitOfVolume.LITERS,
+    ),
+    SensorEntityDescription(
+        key="short_average",
+        translation_key="short_average",
+        icon="mdi:chart-line",
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=f"{UnitOfVolume.LITERS}/{UnitOfTime.DAYS}",
+        suggested_display_precision=1,
+    ),
+    SensorEntityDescription(
+        key="long_average",
+        translation_key="long_average",
+        icon="mdi:chart-line",
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=f"{UnitOfVolume.LITERS}/{UnitOfTime.DAYS}",
+        suggested_display_precision=1,
+    ),
+    SensorEntityDescription(
+        key="year_to_date",
+        translation_key="year_to_date",
+        icon="mdi:calendar-range",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        device_class=SensorDeviceClass.WATER,
+        native_unit_of_measurement=UnitOfVolume.LITERS,
+    ),
+    SensorEntityDescription(
+        key="projected_invoice_volume",
+        translation_key="projected_invoice_volume",
+        icon="mdi:receipt-text-clock-outline",
+        device_class=SensorDeviceClass.WATER,
+        native_unit_of_measurement=UnitOfVolume.LITERS,
+        suggested_display_precision=0,
+    ),
+)
+
+
+# Instrumentation of the refreshes of the account, disabled by default
+DIAGNOSTIC_SENSORS: tuple[SensorEntityDescription, ...] = (
+    SensorEntityDescription(
+        key="refresh_duration",
+        translation_key="refresh_duration",
+        icon="mdi:timer-outline",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+    ),
+    SensorEntityDescription(
+        key="http_calls",
+        translation_key="http_calls",
+        icon="mdi:api",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    SensorEntityDescription(
+        key="http_retries",
+        translation_key="http_retries",
+        icon="mdi:reload-alert",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    SensorEntityDescription(
+        key="recorder_rows_written",
+        translation_key="recorder_rows_written",
+        icon="mdi:database-arrow-down-outline",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+)
+
 
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities: AddEntitiesCallback):
     """Add Agur sensors from a config_entry."""
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
     entities = []
     for contract_id in coordinator.contract_ids:
+        if contract_id not in coordinator.data:
+            _LOGGER.warning(f"No data available for Agur contract {contract_id}, its sensors will be added on reload")
+            continue
         _LOGGER.debug(f"Add sensor for Agur contract {contract_id}")
         for entity_description in SENSORS:
             entities.append(AgurSensor(
@@ -58,7 +145,20 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
                 unique_id=config_entry.entry_id,
                 entity_description=entity_description
             ))
-    async_add_entities(entities, True)
+        for entity_description in ANALYTICS_SENSORS:
+            entities.append(AgurAnalyticsSensor(
+                coordinator=coordinator,
+                contract_id=contract_id,
+                unique_id=config_entry.entry_id,
+                entity_description=entity_description
+            ))
+    for entity_description in DIAGNOSTIC_SENSORS:
+        entities.append(AgurDiagnosticSensor(
+            coordinator=coordinator,
+            unique_id=config_entry.entry_id,
+            entity_description=entity_description
+        ))
+    async_add_entities(entities, False)
 
 
 class AgurSensor(CoordinatorEntity[AgurDataUpdateCoordinator], SensorEntity):
@@ -80,31 +180,101 @@ class AgurSensor(CoordinatorEntity[AgurDataUpdateCoordinator], SensorEntity):
         self.entity_id = f"{SENSOR_PLATFORM}.{DOMAIN}_{entity_description.key}_{contract_id}"
         self._attr_unique_id = f"{entity_description.key}_{unique_id}"
         self._contract_id = contract_id
+        # The availability, state and attributes last written to the state machine
+        self._written_state: tuple[bool, Any, dict[str, Any] | None] | None = None
+
+        # The contract data the attributes were computed from, and these attributes. The coordinator builds new
+        # contract data whenever it changes, so its identity tells whether the attributes need to be computed again.
+        self._attributes_source: AgurDataUpdateCoordinatorData | None = None
+        self._attributes: dict[str, Any] | None = None
+        self._device_info_source: AgurDataUpdateCoordinatorData | None = None
+        self._device_info: DeviceInfo | None = None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return the attributes of the sensor, computed from the current data of its contract."""
+        contract_data = self.coordinator.data.get(self._contract_id) if self.coordinator.data is not None else None
+        if contract_data is None:
+            return None
+        if contract_data is self._attributes_source:
+            return self._attributes
 
-        self._attr_extra_state_attributes = {
-            "contract_id": contract_id,
-            "contract_address": self.coordinator.data[contract_id].contract.address,
-            "contract_owner": self.coordinator.data[contract_id].contract.owner,
-            "meter_serial_number": self.coordinator.data[contract_id].contract.meter_serial_number,
+        attributes = {
+            "contract_id": self._contract_id,
+            "contract_address": contract_data.contract.address,
+            "contract_owner": contract_data.contract.owner,
+            "meter_serial_number": contract_data.contract.meter_serial_number,
+            # The last refresh of the contract failed, so the state is the one of a previous refresh
+            "stale": contract_data.stale,
         }
 
-        if entity_description.key != "balance":
-            self._attr_extra_state_attributes["date"] = getattr(
-                self.coordinator.data[self._contract_id],
-                f"{self.entity_description.key}_date"
-            ),
+        if self.entity_description.key == "last_invoice":
+            attributes["date"] = contract_data.last_invoice_date
+        elif self.entity_description.key != "balance":
+            # The other sensors are computed from the readings, up to the last one
+            attributes["date"] = contract_data.last_index_date
 
-        if entity_description.key == "last_invoice":
-            invoice = self.coordinator.data[contract_id].last_invoice
+        if self.entity_description.key == "last_invoice":
+            invoice = contract_data.last_invoice
             if invoice is not None:
-                self._attr_extra_state_attributes["invoice_number"] = invoice.number
-                self._attr_extra_state_attributes["payment_date"] = invoice.payment_date
+                attributes["invoice_number"] = invoice.number
+                attributes["payment_date"] = invoice.payment_date
 
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, self.coordinator.data[contract_id].contract.meter_id)},
-            name=self.coordinator.data[contract_id].contract.meter_serial_number,
-            serial_number=self.coordinator.data[contract_id].contract.meter_serial_number
+        self._attributes_source = contract_data
+        self._attributes = attributes
+        return attributes
+
+    @property
+    def device_info(self) -> DeviceInfo | None:
+        """Return the meter of the contract of this sensor."""
+        contract_data = self.coordinator.data.get(self._contract_id) if self.coordinator.data is not None else None
+        if contract_data is None:
+            return None
+        if contract_data is self._device_info_source:
+            return self._device_info
+
+        self._device_info_source = contract_data
+        self._device_info = DeviceInfo(
+            identifiers={(DOMAIN, contract_data.contract.meter_id)},
+            name=contract_data.contract.meter_serial_number,
+            serial_number=contract_data.contract.meter_serial_number
         )
+        return self._device_info
+
+    async def async_added_to_hass(self) -> None:
+        """Remember the state written when the entity is added."""
+        await super().async_added_to_hass()
+        self._written_state = self._current_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if it changed since it was last written."""
+        if (
+                self._written_state is not None
+                and self._written_state[0]
+                and self.coordinator.last_update_success
+                and self._contract_id not in self.coordinator.changed_contract_ids
+                and self._contract_id not in self.coordinator.stale_changed_contract_ids
+        ):
+            # Nothing changed for the contract of this sensor
+            return
+
+        state = self._current_state()
+        if state == self._written_state:
+            return
+
+        self._written_state = state
+        self.async_write_ha_state()
+
+    def _current_state(self) -> tuple[bool, Any, dict[str, Any] | None]:
+        if not self.available:
+            return False, None, None
+        return True, self.native_value, self.extra_state_attributes
+
+    @property
+    def available(self) -> bool:
+        """Return if the contract of this sensor has data."""
+        return super().available and self._contract_id in self.coordinator.data
 
     @property
     def native_value(self) -> float:
@@ -113,3 +283,76 @@ class AgurSensor(CoordinatorEntity[AgurDataUpdateCoordinator], SensorEntity):
             self.coordinator.data[self._contract_id],
             self.entity_description.key if self.entity_description.key == "balance" else f"{self.entity_description.key}_value"
         )
+
+
+class AgurAnalyticsSensor(AgurSensor):
+    """Agur sensor class for the consumption derived from the readings of a contract."""
+
+    def __init__(
+            self,
+            coordinator: AgurDataUpdateCoordinator,
+            unique_id: str,
+            contract_id: str,
+            entity_description: SensorEntityDescription
+    ) -> None:
+        """Pass coordinator to CoordinatorEntity."""
+        super().__init__(
+            coordinator=coordinator,
+            unique_id=unique_id,
+            contract_id=contract_id,
+            entity_description=entity_description
+        )
+        # Unique across the contracts of the account
+        self._attr_unique_id = f"{entity_description.key}_{contract_id}_{unique_id}"
+
+    @property
+    def available(self) -> bool:
+        """Return if the readings of the contract of this sensor were analysed."""
+        return super().available and self._contract_id in self.coordinator.analytics
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the state of the sensor."""
+        return getattr(self.coordinator.analytics[self._contract_id], self.entity_description.key)
+
+
+class AgurDiagnosticSensor(CoordinatorEntity[AgurDataUpdateCoordinator], SensorEntity):
+    """Agur sensor class for the instrumentation of the refreshes of an account."""
+    _attr_has_entity_name = True
+
+    def __init__(
+            self,
+            coordinator: AgurDataUpdateCoordinator,
+            unique_id: str,
+            entity_description: SensorEntityDescription
+    ) -> None:
+        """Pass coordinator to CoordinatorEntity."""
+        super().__init__(coordinator=coordinator)
+
+        self.entity_description = entity_description
+
+        self.entity_id = f"{SENSOR_PLATFORM}.{DOMAIN}_{entity_description.key}_{slugify(coordinator.username)}"
+        self._attr_unique_id = f"{entity_description.key}_{unique_id}"
+
+    async def async_added_to_hass(self) -> None:
+        """Write the state at the end of each refresh."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, metrics_signal(self.coordinator.username), self.async_write_ha_state)
+        )
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Do nothing, the state is written from the metrics signal sent at the end of every refresh instead."""
+
+    @property
+    def available(self) -> bool:
+        """Return True, the instrumentation is available even when the refreshes fail."""
+        return True
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the state of the sensor."""
+        if self.entity_description.key == "refresh_duration":
+            return self.coordinator.metrics.last_time("phase.refresh")
+        return self.coordinator.metrics.counters[self.entity_description.key]
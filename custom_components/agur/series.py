@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime
+from itertools import accumulate, islice, repeat
+from operator import sub
+
+from homeassistant.util import dt as dt_util
+
+from .agur_client import AgurDataPoint
+
+
+def day_start(date: datetime) -> datetime:
+    return date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_start(date: datetime) -> datetime:
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def year_start(date: datetime) -> datetime:
+    return date.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+class AgurDataSeries:
+    """
+    Compact time series of index readings, sorted from date ascending.
+
+    Dates are kept as epoch timestamps and values as floats, each in a typed array, which takes 16 bytes per reading
+    instead of a full `AgurDataPoint` object and its `datetime`. Dates are given back in the time zone of Home
+    Assistant, with the offset of their own date, so that readings on each side of a DST change fall in the right day.
+    """
+
+    __slots__ = ("timestamps", "values")
+
+    def __init__(self, data_points: Iterable[AgurDataPoint] = ()) -> None:
+        """Initialize from readings sorted from date ascending."""
+        self.timestamps = array("d")
+        self.values = array("d")
+        self.extend(data_points)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index: int) -> AgurDataPoint:
+        return AgurDataPoint.from_values(date=self.to_datetime(self.timestamps[index]), value=self.values[index])
+
+    def __iter__(self) -> Iterator[AgurDataPoint]:
+        for timestamp, value in zip(self.timestamps, self.values):
+            yield AgurDataPoint.from_values(date=self.to_datetime(timestamp), value=value)
+
+    def __reversed__(self) -> Iterator[AgurDataPoint]:
+        for index in range(len(self) - 1, -1, -1):
+            yield self[index]
+
+    @property
+    def latest(self) -> AgurDataPoint | None:
+        return self[-1] if len(self) > 0 else None
+
+    @property
+    def latest_value(self) -> float | None:
+        return self.values[-1] if len(self) > 0 else None
+
+    @property
+    def latest_date(self) -> datetime | None:
+        return self.to_datetime(self.timestamps[-1]) if len(self) > 0 else None
+
+    def to_datetime(self, timestamp: float) -> datetime:
+        return datetime.fromtimestamp(timestamp, dt_util.DEFAULT_TIME_ZONE)
+
+    def extend(self, data_points: Iterable[AgurDataPoint]) -> None:
+        """Append readings sorted from date ascending, and more recent than the ones already in the series."""
+        for data_point in data_points:
+            if data_point.date is None or data_point.value is None:
+                continue
+            self.timestamps.append(data_point.date.timestamp())
+            self.values.append(data_point.value)
+
+    def truncate(self, index: int) -> None:
+        """Remove the readings from `index` onwards."""
+        del self.timestamps[index:]
+        del self.values[index:]
+
+    def bisect(self, date: datetime) -> int:
+        """Return the index of the first reading at or after `date`."""
+        return bisect_left(self.timestamps, date.timestamp())
+
+    def value_at(self, date: datetime) -> float | None:
+        """Return the value of the last reading at or before `date`."""
+        index = bisect_right(self.timestamps, date.timestamp())
+        return self.values[index - 1] if index > 0 else None
+
+    def deltas(self) -> array:
+        """Return the difference between each reading and the previous one, i.e. `len(self) - 1` values."""
+        return array("d", map(sub, islice(self.values, 1, None), self.values))
+
+    def consumptions(self) -> array:
+        """
+        Return the consumption since the previous reading of each reading, i.e. `len(self)` values starting with 0.
+
+        A reading lower than the previous one, i.e. the meter was reset or replaced, counts as no consumption.
+        """
+        consumptions = array("d", [0.0] if len(self) > 0 else [])
+        consumptions.extend(map(max, self.deltas(), repeat(0.0)))
+        return consumptions
+
+    def aggregate(
+            self,
+            period_start: Callable[[datetime], datetime],
+            since: datetime | None = None
+    ) -> list[tuple[datetime, float, int]]:
+        """
+        Return the consumption per period, attributed to the period of the reading closing each delta, along with the
+        index of the last reading of the period. Only the periods from the one of `since` are returned if it is set.
+        """
+        first = bisect_left(self.timestamps, period_start(since).timestamp()) if since is not None else 0
+
+        aggregates: list[tuple[datetime, float, int]] = []
+        for index in range(first, len(self)):
+            consumption = max(self.values[index] - self.values[index - 1], 0.0) if index > 0 else 0.0
+            period = period_start(self.to_datetime(self.timestamps[index]))
+            if len(aggregates) > 0 and aggregates[-1][0] == period:
+                aggregates[-1] = (period, aggregates[-1][1] + consumption, index)
+            else:
+                aggregates.append((period, consumption, index))
+        return aggregates
+
+    def daily(self) -> list[tuple[datetime, float]]:
+        """Return the consumption per day, attributed to the day of the reading closing each delta."""
+        return [(start, consumption) for start, consumption, _ in self.aggregate(day_start)]
+
+    def monthly(self) -> list[tuple[datetime, float]]:
+        """Return the consumption per month, attributed to the month of the reading closing each delta."""
+        return [(start, consumption) for start, consumption, _ in self.aggregate(month_start)]
+
+    def rolling_average(self, window: int) -> array:
+        """Return the average consumption over each run of `window` consecutive deltas, i.e. `len(self) - window` values."""
+        consumptions = self.consumptions()[1:]
+        if window <= 0 or len(consumptions) < window:
+            return array("d")
+
+        sums = array("d", accumulate(consumptions, initial=0.0))
+        return array("d", (total / window for total in map(sub, islice(sums, window, None), sums)))
@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from itertools import accumulate, islice, repeat
+from math import isclose
+from operator import sub
+from typing import Any
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics, get_metadata, \
+    statistics_during_period
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import UnitOfVolume
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_VERSION, backfill_storage_key
+from .series import AgurDataSeries, month_start, year_start
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+# How far back, from the most recent reading, statistics are imported again in case readings were corrected
+STATISTICS_REIMPORT_WINDOW = timedelta(days=30)
+# Number of statistics rows submitted to the recorder at once when importing the whole history of a contract
+BACKFILL_CHUNK_SIZE = 500
+# Pause between two chunks, which leaves time to the recorder to commit a chunk before receiving the next one
+BACKFILL_CHUNK_DELAY = 1
+# The periods over which the consumption is also imported pre-aggregated, with the start of the period of a date
+ROLLUP_PERIODS: dict[str, tuple[str, Callable[[datetime], datetime]]] = {
+    "monthly": ("Monthly water consumption", month_start),
+    "yearly": ("Yearly water consumption", year_start),
+}
+
+
+def statistic_id_for(contract_id: str) -> str:
+    return f"{DOMAIN}:water_consumption_{contract_id}"
+
+
+def rollup_statistic_id_for(contract_id: str, period: str) -> str:
+    return f"{DOMAIN}:water_consumption_{period}_{contract_id}"
+
+
+def statistic_metadata(statistic_id: str, name: str = "Water consumption") -> StatisticMetaData:
+    return StatisticMetaData(
+        has_mean=False,
+        has_sum=True,
+        name=name,
+        source=DOMAIN,
+        statistic_id=statistic_id,
+        unit_of_measurement=UnitOfVolume.LITERS,
+    )
+
+
+def read_statistics(
+        hass: HomeAssistant,
+        starts: dict[str, datetime]
+) -> tuple[set[str], dict[str, list[dict[str, Any]]]]:
+    """
+    Return which of the statistics already exist, and the rows of each of them from its start in `starts`, for all of
+    them at once.
+
+    This runs in the recorder executor.
+    """
+    metadata = get_metadata(hass, statistic_ids=set(starts.keys()))
+    if len(metadata) == 0:
+        return set(), {}
+
+    statistic_ids_by_start: dict[datetime, set[str]] = {}
+    for statistic_id in metadata:
+        statistic_ids_by_start.setdefault(starts[statistic_id], set()).add(statistic_id)
+
+    rows: dict[str, list[dict[str, Any]]] = {}
+    for start, statistic_ids in statistic_ids_by_start.items():
+        rows.update(statistics_during_period(hass, start, None, statistic_ids, "hour", None, {"state", "sum"}))
+    return set(metadata.keys()), rows
+
+
+def statistic_start(series: AgurDataSeries, index: int) -> datetime:
+    """Return the start of the statistic of the reading at `index` of a series, i.e. the hour of the reading."""
+    return series.to_datetime(series.timestamps[index]).replace(minute=0, second=0, microsecond=0)
+
+
+def reimport_start(series: AgurDataSeries) -> datetime:
+    """
+    Return the start of the statistic of the last reading before the reimport window of a non-empty series, from which
+    the statistics of the window carry on, or of the first reading if the window covers the whole series.
+    """
+    first = bisect_right(series.timestamps, (series.latest_date - STATISTICS_REIMPORT_WINDOW).timestamp())
+    return statistic_start(series, max(first - 1, 0))
+
+
+def rollup_reimport_start(
+        series: AgurDataSeries,
+        period_start: Callable[[datetime], datetime],
+        since: datetime
+) -> datetime:
+    """
+    Return the start of the period before the one of `since` of a non-empty series, from which the rollup statistics
+    carry on, or of the period of the first reading if there is no reading before the one of `since`.
+    """
+    first = bisect_left(series.timestamps, period_start(since).timestamp())
+    return period_start(series.to_datetime(series.timestamps[max(first - 1, 0)]))
+
+
+def recorded_sum(existing_rows: list[dict[str, Any]], start: datetime) -> float | None:
+    """Return the sum of the recorded row starting at `start`, among rows sorted from start ascending, if any."""
+    timestamp = start.timestamp()
+    for row in existing_rows:
+        row_timestamp = _row_timestamp(row)
+        if row_timestamp == timestamp:
+            return row.get("sum")
+        if row_timestamp > timestamp:
+            break
+    return None
+
+
+def build_statistics(
+        series: AgurDataSeries,
+        min_start: datetime | None = None,
+        existing_rows: list[dict[str, Any]] | None = None
+) -> list[StatisticData]:
+    """
+    Build the statistics of a series of index readings, for the readings strictly after `min_start` if set.
+
+    The state of each statistic is the consumption since the previous reading, and its sum is the first index of the
+    series plus all the consumption since. A reading lower than the previous one, i.e. the meter was reset or
+    replaced, counts as no consumption, so that the sum never decreases.
+
+    If the recorded rows of the statistic include the one of the last reading before `min_start`, the sums carry on
+    from it, so that only the readings after `min_start` are read.
+    """
+    if len(series) == 0:
+        return []
+
+    first = bisect_right(series.timestamps, min_start.timestamp()) if min_start is not None else 0
+    if 0 < first < len(series) and existing_rows is not None:
+        previous_start = statistic_start(series, first - 1)
+        # The row of a reading within the same hour as the first one of the window holds the sum of the latter
+        if previous_start != statistic_start(series, first):
+            total = recorded_sum(existing_rows, previous_start)
+            if total is not None:
+                statistics, _ = build_statistics_chunk(series, first, len(series), total)
+                return statistics
+    return statistics_rows(series, statistics_columns(series), first, len(series))
+
+
+def statistics_columns(series: AgurDataSeries) -> tuple[array, array]:
+    """Return the state and the sum of the statistic of each reading of a non-empty series."""
+    consumptions = series.consumptions()
+    sums = array("d", accumulate(consumptions, initial=series.values[0]))
+    del sums[0]
+    return consumptions, sums
+
+
+def statistics_rows(
+        series: AgurDataSeries,
+        columns: tuple[array, array],
+        first: int,
+        last: int
+) -> list[StatisticData]:
+    """Build the statistics of the readings of a series between the indexes `first` included and `last` excluded."""
+    consumptions, sums = columns
+    return [
+        StatisticData(start=statistic_start(series, index), state=consumptions[index], sum=sums[index])
+        for index in range(first, last)
+    ]
+
+
+def statistic_sum_at(series: AgurDataSeries, index: int) -> float:
+    """Return the sum of the statistic of the reading at `index` of a series, from the readings up to it only."""
+    consumptions = map(max, map(sub, islice(series.values, 1, index + 1), series.values), repeat(0.0))
+    return series.values[0] + sum(consumptions)
+
+
+def build_statistics_chunk(
+        series: AgurDataSeries,
+        first: int,
+        last: int,
+        total: float
+) -> tuple[list[StatisticData], float]:
+    """
+    Build the statistics of the readings of a series between the indexes `first` included and `last` excluded, from
+    the sum `total` of the statistic of the reading before `first`, if any. Returns them along with the sum of the
+    statistic of the last one, so that the next chunk can carry on from it.
+    """
+    statistics = []
+    for index in range(first, last):
+        if index == 0:
+            consumption = 0.0
+            total = series.values[0]
+        else:
+            consumption = max(series.values[index] - series.values[index - 1], 0.0)
+            total += consumption
+        statistics.append(StatisticData(start=statistic_start(series, index), state=consumption, sum=total))
+    return statistics, total
+
+
+def build_rollup_statistics(
+        series: AgurDataSeries,
+        period_start: Callable[[datetime], datetime],
+        since: datetime | None = None,
+        existing_rows: list[dict[str, Any]] | None = None
+) -> list[StatisticData]:
+    """
+    Build one statistic per period of a series of index readings, for the periods from the one of `since` if set.
+
+    Each statistic starts at the start of its period. Its state is the consumption of the readings of the period and
+    its sum is the one of the last reading of the period, so that it matches the statistics of the readings.
+
+    If the recorded rows of the rollup include the one of the period before the one of `since`, the sums carry on from
+    it, so that only the readings from the period of `since` are read.
+    """
+    if len(series) == 0:
+        return []
+
+    aggregates = series.aggregate(period_start, since)
+    first = bisect_left(series.timestamps, period_start(since).timestamp()) if since is not None else 0
+    if first > 0 and existing_rows is not None:
+        total = recorded_sum(existing_rows, period_start(series.to_datetime(series.timestamps[first - 1])))
+        if total is not None:
+            statistics = []
+            for start, consumption, _ in aggregates:
+                total += consumption
+                statistics.append(StatisticData(start=start, state=consumption, sum=total))
+            return statistics
+
+    _, sums = statistics_columns(series)
+    return [StatisticData(start=start, state=consumption, sum=sums[last]) for start, consumption, last in aggregates]
+
+
+def diff_statistics(statistics: list[StatisticData], existing_rows: list[dict[str, Any]]) -> list[StatisticData]:
+    """Return the statistics that are not in the recorder yet, or whose state or sum differ from the recorded ones."""
+    existing: dict[float, tuple[float | None, float | None]] = {
+        _row_timestamp(row): (row.get("state"), row.get("sum")) for row in existing_rows
+    }
+
+    return [
+        statistic
+        for statistic in statistics
+        if not _is_recorded(statistic, existing.get(statistic["start"].timestamp()))
+    ]
+
+
+def _row_timestamp(row: dict[str, Any]) -> float:
+    start = row["start"]
+    # Depending on the version of Home Assistant, the start is either a datetime or a timestamp
+    return start.timestamp() if isinstance(start, datetime) else float(start)
+
+
+def _is_recorded(statistic: StatisticData, recorded: tuple[float | None, float | None] | None) -> bool:
+    if recorded is None or recorded[0] is None or recorded[1] is None:
+        return False
+    return isclose(statistic["state"], recorded[0], abs_tol=1e-6) and isclose(statistic["sum"], recorded[1], abs_tol=1e-6)
+
+
+class AgurStatisticsBackfill:
+    """
+    Import the whole history of statistics of the contracts of an account, in chunks, in the background.
+
+    The timestamp of the last reading submitted is saved after each chunk, so that an import interrupted by a restart
+    resumes where it stopped instead of starting over.
+    """
+
+    def __init__(self, hass: HomeAssistant, username: str) -> None:
+        """Initialize."""
+        self.hass = hass
+        self._store = Store(hass, STORAGE_VERSION, backfill_storage_key(username))
+        # The timestamp of the last reading submitted for each statistic whose import is not complete
+        self._checkpoints: dict[str, float] | None = None
+        # The series waiting to be imported, by statistic
+        self._pending: dict[str, AgurDataSeries] = {}
+        # Number of readings imported, and total number of readings, of each statistic imported since startup
+        self.progress: dict[str, tuple[int, int]] = {}
+        self._config_entry: ConfigEntry | None = None
+        self._task: asyncio.Task | None = None
+
+    async def async_load(self) -> None:
+        if self._checkpoints is None:
+            stored = await self._store.async_load()
+            self._checkpoints = stored.get("checkpoints", {}) if stored else {}
+
+    def is_queued(self, statistic_id: str) -> bool:
+        """Return whether the import of the statistic is waiting or running."""
+        return statistic_id in self._pending
+
+    def is_complete(self, statistic_id: str) -> bool:
+        """Return whether the import of the statistic is neither queued nor interrupted before completing."""
+        return statistic_id not in self._pending and statistic_id not in (self._checkpoints or {})
+
+    def schedule(self, statistic_id: str, series: AgurDataSeries, restart: bool) -> None:
+        """Queue the import of the whole series, from the start if `restart` is set or from its last checkpoint."""
+        if restart and statistic_id not in self._pending:
+            self._checkpoints.pop(statistic_id, None)
+        self._pending[statistic_id] = series
+        self._async_start_task()
+
+    def start(self, config_entry: ConfigEntry) -> None:
+        """Start running the imports queued, and the ones queued from now on, as background tasks of the entry."""
+        self._config_entry = config_entry
+        self._async_start_task()
+
+    def cancel(self) -> None:
+        """Stop the running import, which resumes from its last checkpoint the next time it is queued."""
+        self._config_entry = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            statistic_id: {"imported": imported, "total": total}
+            for statistic_id, (imported, total) in self.progress.items()
+        }
+
+    def _async_start_task(self) -> None:
+        if self._config_entry is None or len(self._pending) == 0:
+            return
+        if self._task is not None and not self._task.done():
+            return
+        self._task = self._config_entry.async_create_background_task(
+            self.hass,
+            self._async_run(),
+            f"{DOMAIN} statistics backfill {self._config_entry.entry_id}"
+        )
+
+    async def _async_run(self) -> None:
+        while len(self._pending) > 0:
+            statistic_id, series = next(iter(self._pending.items()))
+            await self._async_import(statistic_id, series)
+            self._pending.pop(statistic_id, None)
+
+    async def _async_import(self, statistic_id: str, series: AgurDataSeries) -> None:
+        checkpoint = self._checkpoints.get(statistic_id)
+        if checkpoint is None:
+            first = 0
+        else:
+            # Submit the last chunk again, in case it was not committed by the recorder before the restart. Rows with
+            # the same start replace the existing ones, so this is harmless.
+            first = max(bisect_right(series.timestamps, checkpoint) - BACKFILL_CHUNK_SIZE, 0)
+            _LOGGER.debug(f"Resuming the import of the statistics of '{statistic_id}' from reading {first}")
+
+        metadata = statistic_metadata(statistic_id)
+        # The sum of the statistics is carried from one chunk to the next, so that each chunk only reads its readings.
+        # This also covers the readings appended to the series while it is imported.
+        total = statistic_sum_at(series, first - 1) if first > 0 else 0.0
+        while first < len(series):
+            last = min(first + BACKFILL_CHUNK_SIZE, len(series))
+            statistics, total = build_statistics_chunk(series, first, last, total)
+            async_add_external_statistics(self.hass, metadata, statistics)
+
+            self._checkpoints[statistic_id] = series.timestamps[last - 1]
+            await self._store.async_save({"checkpoints": self._checkpoints})
+            self.progress[statistic_id] = (last, len(series))
+            _LOGGER.debug(f"Imported {last} of {len(series)} statistics of '{statistic_id}'")
+
+            first = last
+            await asyncio.sleep(BACKFILL_CHUNK_DELAY)
+
+        self._checkpoints.pop(statistic_id, None)
+        await self._store.async_save({"checkpoints": self._checkpoints})
+        self.progress[statistic_id] = (len(series), len(series))
+        _LOGGER.debug(f"Import of the statistics of '{statistic_id}' complete")
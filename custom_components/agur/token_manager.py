@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
+
+from .agur_client import AgurClient
+from .const import DOMAIN, DATA_TOKEN_MANAGERS, STORAGE_VERSION, tokens_storage_key
+from .scheduler import async_get_fleet_scheduler
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+# How long before their expiration the tokens are proactively refreshed
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+@callback
+def async_get_token_manager(hass: HomeAssistant, username: str, password: str) -> AgurTokenManager:
+    """Return the token manager shared by everything using the given Agur account."""
+    token_managers: dict[str, AgurTokenManager] = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_TOKEN_MANAGERS, {})
+
+    token_manager = token_managers.get(username)
+    if token_manager is None:
+        token_manager = token_managers[username] = AgurTokenManager(hass, username, password)
+    elif token_manager.password != password:
+        # The credentials changed, so the tokens we hold were not obtained with them
+        token_manager.password = password
+        token_manager.clear()
+
+    return token_manager
+
+
+class AgurTokenManager:
+    """Class to hold the API tokens of an Agur account, and to refresh them only once for all its users."""
+
+    def __init__(self, hass: HomeAssistant, username: str, password: str) -> None:
+        """Initialize."""
+        self.hass = hass
+        self.username = username
+        self.password = password
+        self.session_token: str | None = None
+        self.auth_token: str | None = None
+        self.expiration_date: datetime | None = None
+        self._store = Store(hass, STORAGE_VERSION, tokens_storage_key(username))
+        self._restored = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_valid(self) -> bool:
+        """Return whether the tokens are present and not about to expire."""
+        if self.session_token is None or self.auth_token is None or self.expiration_date is None:
+            return False
+        return datetime.now(self.expiration_date.tzinfo) < self.expiration_date - TOKEN_REFRESH_MARGIN
+
+    def clear(self) -> None:
+        """Forget the current tokens, so that the next call to `async_get_tokens` logs in again."""
+        self.session_token = None
+        self.auth_token = None
+        self.expiration_date = None
+
+    async def async_get_tokens(self, rejected_auth_token: str | None = None) -> tuple[str, str]:
+        """
+        Return valid session and auth tokens, logging in if needed.
+
+        Concurrent callers wait for a single refresh. A caller whose token was rejected by the API passes it as
+        `rejected_auth_token`, which triggers a refresh only if nobody refreshed the tokens in the meantime.
+        """
+        async with self._lock:
+            if not self._restored:
+                await self._async_restore()
+
+            if rejected_auth_token is not None and rejected_auth_token == self.auth_token:
+                _LOGGER.debug(f"Tokens rejected by the API for Agur account {self.username}")
+                self.clear()
+
+            if not self.is_valid:
+                await self._async_refresh()
+
+            return self.session_token, self.auth_token
+
+    async def async_remove(self) -> None:
+        """Remove the tokens stored on disk."""
+        self.clear()
+        await self._store.async_remove()
+
+    async def _async_refresh(self) -> None:
+        _LOGGER.debug(f"Fetching session and auth tokens for Agur account {self.username}")
+        client = AgurClient(
+            session=async_get_clientsession(self.hass),
+            rate_limiter=async_get_fleet_scheduler(self.hass).rate_limiter,
+            circuit_breaker=async_get_fleet_scheduler(self.hass).circuit_breaker
+        )
+        response = await client.init()
+        client.session_token = response["token"]
+        expiration_date = datetime.fromisoformat(response["expirationDate"])
+        response = await client.login(self.username, self.password)
+
+        self.session_token = client.session_token
+        self.auth_token = response["tokenAuthentique"]
+        self.expiration_date = expiration_date
+        await self._store.async_save({
+            "session_token": self.session_token,
+            "auth_token": self.auth_token,
+            "expiration_date": self.expiration_date.isoformat(),
+        })
+
+    async def _async_restore(self) -> None:
+        self._restored = True
+        stored = await self._store.async_load()
+        if not stored:
+            return
+
+        try:
+            self.expiration_date = datetime.fromisoformat(stored["expiration_date"])
+            self.session_token = stored["session_token"]
+            self.auth_token = stored["auth_token"]
+        except (KeyError, TypeError, ValueError) as exception:
+            _LOGGER.debug(f"Ignoring invalid stored tokens for Agur account {self.username}: {exception}")
+            self.clear()
+            return
+
+        _LOGGER.debug(f"Restored tokens for Agur account {self.username}, valid until {self.expiration_date}")
@@ -0,0 +1,52 @@
+"""Tests for the Agur integration."""
+from typing import Any
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.components.recorder.models import StatisticData
+from homeassistant.core import HomeAssistant
+
+from custom_components.agur.const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_CONTRACT_IDS, \
+    CONF_IMPORT_STATISTICS, CONF_MAX_CONCURRENT_CONTRACTS
+from custom_components.agur.coordinator import AgurDataUpdateCoordinator
+
+USERNAME = "jane.doe@example.com"
+
+
+async def setup_integration(
+        hass: HomeAssistant,
+        contract_ids: list[str],
+        import_statistics: bool = True,
+        max_concurrent_contracts: int = 5
+) -> MockConfigEntry:
+    """Set up an Agur account with the given contracts, against the fake API started by the `fake_agur` fixture."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_USERNAME: USERNAME, CONF_PASSWORD: "secret"},
+        options={
+            CONF_CONTRACT_IDS: contract_ids,
+            CONF_IMPORT_STATISTICS: import_statistics,
+            CONF_MAX_CONCURRENT_CONTRACTS: max_concurrent_contracts,
+        },
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    return config_entry
+
+
+def get_coordinator(hass: HomeAssistant, config_entry: MockConfigEntry) -> AgurDataUpdateCoordinator:
+    return hass.data[DOMAIN][config_entry.entry_id]
+
+
+def recorded_rows(statistics: list[StatisticData]) -> list[dict[str, Any]]:
+    """Return the rows the recorder keeps for the statistics, i.e. the last one of each start, sorted by start."""
+    rows = {
+        statistic["start"].timestamp(): {
+            "start": statistic["start"].timestamp(),
+            "state": statistic["state"],
+            "sum": statistic["sum"],
+        }
+        for statistic in statistics
+    }
+    return [rows[start] for start in sorted(rows)]
@@ -0,0 +1,78 @@
+"""Fixtures for the Agur integration tests."""
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+import pytest
+
+from custom_components.agur import agur_client, scheduler
+
+from .fake_agur import FakeAgurApi
+
+# The results of each benchmark, by test function, printed as a table at the end of the run
+BENCHMARK_RESULTS = pytest.StashKey[dict[str, list[dict[str, Any]]]]()
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption("--benchmark", action="store_true", help="run the benchmarks against the fake Agur API")
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.stash[BENCHMARK_RESULTS] = {}
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks only run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus: int, config: pytest.Config) -> None:
+    for name, results in config.stash[BENCHMARK_RESULTS].items():
+        columns = list(results[0].keys())
+        widths = [max(len(column), *(len(str(result[column])) for result in results)) for column in columns]
+        terminalreporter.section(f"Agur benchmark: {name}")
+        terminalreporter.write_line(" | ".join(column.rjust(width) for column, width in zip(columns, widths)))
+        for result in results:
+            terminalreporter.write_line(
+                " | ".join(str(result[column]).rjust(width) for column, width in zip(columns, widths))
+            )
+
+
+@pytest.fixture
+def benchmark_results(request: pytest.FixtureRequest) -> list[dict[str, Any]]:
+    """Return the list of the results of the benchmark, printed at the end of the run."""
+    return request.config.stash[BENCHMARK_RESULTS].setdefault(request.node.originalname, [])
+
+
+@pytest.fixture
+async def fake_agur(
+        recorder_mock,
+        enable_custom_integrations,
+        socket_enabled,
+        monkeypatch: pytest.MonkeyPatch
+) -> AsyncIterator[Callable[..., Awaitable[FakeAgurApi]]]:
+    """
+    Return a function starting a fake Agur API with the given `FakeAgurApi` arguments, which the integration calls.
+
+    The integration depends on the recorder, which must be set up before Home Assistant: tests request `recorder_mock`
+    before `hass`. The fake API listens on the loopback interface, the only one sockets are allowed to, and the rate
+    limit of the Agur API is lifted so that the tests measure the integration rather than the limit.
+    """
+    apis: list[FakeAgurApi] = []
+    monkeypatch.setattr(scheduler, "API_RATE_LIMIT", 1e6)
+    monkeypatch.setattr(scheduler, "API_RATE_BURST", 1_000_000)
+
+    async def start(**kwargs) -> FakeAgurApi:
+        api = FakeAgurApi(**kwargs)
+        await api.start()
+        monkeypatch.setattr(agur_client, "API_BASE_URL", api.base_url)
+        apis.append(api)
+        return api
+
+    yield start
+
+    for api in apis:
+        await api.close()
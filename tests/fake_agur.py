@@ -0,0 +1,212 @@
+"""Fake Agur API, served locally to exercise the integration end to end."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from itertools import accumulate
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+SESSION_TOKEN = "fake-session-token"
+AUTH_TOKEN = "fake-auth-token"
+# Date of the most recent reading of every contract
+LAST_READING_DATE = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+
+
+def contract_id_for(index: int) -> str:
+    return f"{index + 1:08d}"
+
+
+class FakeAgurApi:
+    """
+    Fake Agur API serving an account of `contracts` contracts, each with `readings` readings and `invoices` invoices.
+    The consumption of each reading varies randomly by up to `noise` around the usual one of its contract.
+
+    Every request waits for `latency` seconds before being answered, and fails with a `503` with a probability of
+    `error_rate`. The paginated endpoints answer with at most `page_size` items per page, or the number of items asked
+    for if lower. With `etags`, responses carry an `ETag` and conditional requests are answered with `304` when the
+    response did not change.
+    """
+
+    def __init__(
+            self,
+            contracts: int = 1,
+            readings: int = 365,
+            invoices: int = 12,
+            reading_interval: timedelta = timedelta(days=1),
+            noise: float = 0.0,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            page_size: int | None = None,
+            etags: bool = True,
+            seed: int = 0
+    ) -> None:
+        """Initialize."""
+        self.latency = latency
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.etags = etags
+        self._random = random.Random(seed)
+        self.contract_ids = [contract_id_for(index) for index in range(contracts)]
+        # Readings of each contract, most recent first like the API returns them
+        self.readings: dict[str, list[tuple[datetime, float]]] = {}
+        self.invoices: dict[str, list[dict[str, str | float]]] = {}
+        for index, contract_id in enumerate(self.contract_ids):
+            daily_consumption = 100 + index % 50
+            values = list(accumulate(
+                (daily_consumption + self._random.uniform(-noise, noise) if noise > 0 else daily_consumption
+                 for _ in range(readings)),
+                initial=1000.0
+            ))
+            self.readings[contract_id] = [
+                (LAST_READING_DATE - reading * reading_interval, values[readings - reading])
+                for reading in range(readings)
+            ]
+            self.invoices[contract_id] = [
+                {
+                    "numeroFactureClient": f"{contract_id}-{invoice}",
+                    "montantTTCFacture": 42.5,
+                    "dateEmissionFacture": (LAST_READING_DATE - timedelta(days=30 * invoice + 15)).isoformat(),
+                    "dateLimitePaiementFacture": (LAST_READING_DATE - timedelta(days=30 * invoice)).isoformat(),
+                }
+                for invoice in range(invoices)
+            ]
+        # Body and ETag of each response, by path and query, until the data of the account changes
+        self._responses: dict[str, tuple[bytes, str]] = {}
+        # The contracts whose readings fail to be fetched, with a `404`
+        self.unavailable_contract_ids: set[str] = set()
+        # Number of requests received by endpoint, e.g. `Facture/listeFactures`, including the failed ones
+        self.calls: Counter[str] = Counter()
+        # The address of each client connection the requests were received on
+        self.connections: set[tuple[str, int]] = set()
+        self.server: TestServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        return str(self.server.make_url("/webapi"))
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    async def start(self) -> None:
+        self.server = TestServer(self._application())
+        await self.server.start_server()
+
+    async def close(self) -> None:
+        if self.server is not None:
+            await self.server.close()
+
+    def add_reading(self, contract_id: str, consumption: float = 100.0) -> None:
+        """Publish a new reading for a contract, a day after its most recent one."""
+        date, value = self.readings[contract_id][0]
+        self.readings[contract_id].insert(0, (date + timedelta(days=1), value + consumption))
+        self._responses.clear()
+
+    def _application(self) -> web.Application:
+        application = web.Application(middlewares=[self._middleware])
+        application.add_routes([
+            web.post("/webapi/Acces/generateToken", self._generate_token),
+            web.post("/webapi/Utilisateur/authentification", self._authenticate),
+            web.get("/webapi/Abonnement/contrats", self._contracts),
+            web.get("/webapi/Abonnement/detailAbonnement/{contract_id}", self._contract),
+            web.get("/webapi/Facturation/listeConsommationsFacturees/{contract_id}", self._readings),
+            web.get("/webapi/Facture/listeFactures", self._invoices),
+            web.get("/webapi/Facturation/soldeComptableContratAbonnement/{contract_id}", self._balance),
+        ])
+        return application
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.calls["/".join(request.path.split("/")[2:4])] += 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            raise web.HTTPServiceUnavailable()
+        if request.method == "GET" and request.headers.get("Token") != AUTH_TOKEN:
+            raise web.HTTPUnauthorized()
+        return await handler(request)
+
+    def _json(self, request: web.Request, value: Callable[[], Any]) -> web.Response:
+        """Answer with the JSON of `value()`, only called when the response is not known yet."""
+        cached = self._responses.get(request.path_qs)
+        if cached is None:
+            body = json.dumps(value()).encode()
+            cached = self._responses[request.path_qs] = (body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"')
+        body, etag = cached
+        if not self.etags:
+            return web.Response(body=body, content_type="application/json")
+
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    def _page(self, request: web.Request, items: list) -> list:
+        page = int(request.query.get("indexPage", 0))
+        size = int(request.query.get("nbElements", len(items)))
+        if self.page_size is not None:
+            size = min(size, self.page_size)
+        return items[page * size:(page + 1) * size]
+
+    def contract_json(self, contract_id: str) -> dict[str, str]:
+        """Return the details of a contract, as the API returns them."""
+        return {
+            "numeroContrat": contract_id,
+            "nomClientTitulaire": "Jane Doe",
+            "adresseLivraisonConstruite": f"{contract_id} rue de la Nive, Bayonne",
+            "identifiantAppareil": f"meter-{contract_id}",
+            "numeroPhysiqueAppareil": f"S{contract_id}",
+            "numeroPointLivraison": f"P{contract_id}",
+        }
+
+    def readings_json(self, contract_id: str) -> list[dict[str, str | float]]:
+        """Return the readings of a contract, as the API returns them."""
+        return [{"dateReleve": date.isoformat(), "valeurIndex": value} for date, value in self.readings[contract_id]]
+
+    async def _generate_token(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "token": SESSION_TOKEN,
+            "expirationDate": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        })
+
+    async def _authenticate(self, request: web.Request) -> web.Response:
+        if request.headers.get("Token") != SESSION_TOKEN:
+            raise web.HTTPUnauthorized()
+        return web.json_response({"tokenAuthentique": AUTH_TOKEN})
+
+    async def _contracts(self, request: web.Request) -> web.Response:
+        return self._json(request, lambda: {
+            "resultats": self._page(request, [self.contract_json(contract_id) for contract_id in self.contract_ids])
+        })
+
+    async def _contract(self, request: web.Request) -> web.Response:
+        contract_id = request.match_info["contract_id"]
+        if contract_id not in self.readings:
+            raise web.HTTPNotFound()
+        return self._json(request, lambda: self.contract_json(contract_id))
+
+    async def _readings(self, request: web.Request) -> web.Response:
+        contract_id = request.match_info["contract_id"]
+        if contract_id not in self.readings or contract_id in self.unavailable_contract_ids:
+            raise web.HTTPNotFound()
+        return self._json(request, lambda: {"resultats": self.readings_json(contract_id)})
+
+    async def _invoices(self, request: web.Request) -> web.Response:
+        contract_id = request.query.get("numeroContrat")
+        if contract_id not in self.invoices:
+            raise web.HTTPNotFound()
+        return self._json(request, lambda: {"resultats": self._page(request, self.invoices[contract_id])})
+
+    async def _balance(self, request: web.Request) -> web.Response:
+        contract_id = request.match_info["contract_id"]
+        if contract_id not in self.readings:
+            raise web.HTTPNotFound()
+        return self._json(request, lambda: "1.234,56")
@@ -0,0 +1,94 @@
+"""Tests for the detection of an unusual consumption in the readings of a contract."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.agur.agur_client import AgurDataPoint
+from custom_components.agur.analytics import AgurConsumptionAnalytics
+from custom_components.agur.anomaly import AgurAnomalyDetector, ANOMALY_LEAK, ANOMALY_SPIKE, ANOMALY_WARMUP, \
+    ANOMALY_WEIGHT, SPIKE_THRESHOLD
+from custom_components.agur.series import AgurDataSeries
+
+START = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+
+
+def usual_consumption(day: int) -> float:
+    return 100.0 if day % 2 else 110.0
+
+
+def learned_detector(readings: int = 30) -> AgurAnomalyDetector:
+    detector = AgurAnomalyDetector()
+    for day in range(readings):
+        assert detector.update(day, usual_consumption(day)) is None
+    return detector
+
+
+def test_no_anomaly_during_warmup() -> None:
+    detector = AgurAnomalyDetector()
+
+    anomalies = [detector.update(day, 1000.0 if day == 5 else usual_consumption(day)) for day in range(ANOMALY_WARMUP)]
+
+    assert anomalies == [None] * ANOMALY_WARMUP
+    assert detector.count == ANOMALY_WARMUP
+
+
+def test_spike() -> None:
+    detector = learned_detector()
+
+    assert detector.update(30, 1000.0) == ANOMALY_SPIKE
+    assert detector.anomaly == ANOMALY_SPIKE
+    assert detector.update(31, usual_consumption(31)) is None
+    assert detector.anomaly is None
+
+
+def test_leak_over_three_readings() -> None:
+    detector = learned_detector()
+
+    # Each reading is high enough to be a leak if it lasts, but not to be a spike on its own
+    anomalies = [detector.update(30 + day, detector.mean + 2.5 * detector.deviation) for day in range(3)]
+
+    assert anomalies == [None, None, ANOMALY_LEAK]
+    assert detector.elevated == 3
+
+
+def test_anomaly_is_clipped() -> None:
+    detector = learned_detector()
+    mean, deviation = detector.mean, detector.deviation
+
+    detector.update(30, 1e6)
+
+    # The spike moves the usual consumption as if it were only `SPIKE_THRESHOLD` deviations away
+    assert detector.mean == pytest.approx(mean + ANOMALY_WEIGHT * SPIKE_THRESHOLD * deviation)
+    assert detector.deviation < 2 * deviation
+
+
+def test_readings_learned_again_are_ignored() -> None:
+    detector = learned_detector()
+    count, mean = detector.count, detector.mean
+
+    assert detector.update(29, 1000.0) is None
+    assert detector.update(10, 1000.0) is None
+    assert (detector.count, detector.mean) == (count, mean)
+
+
+async def test_no_relearning_after_rewind(hass: HomeAssistant) -> None:
+    indexes = [1000.0]
+    for day in range(1, 60):
+        indexes.append(indexes[-1] + usual_consumption(day))
+    data_points = [
+        AgurDataPoint.from_values(date=START + timedelta(days=day), value=index) for day, index in enumerate(indexes)
+    ]
+    analytics = AgurConsumptionAnalytics(hass, "00000001")
+    analytics.update(AgurDataSeries(data_points), list(reversed(data_points)), [], None)
+    count, mean = analytics.detector.count, analytics.detector.mean
+    assert count > ANOMALY_WARMUP
+
+    # The last reading is corrected to a consumption that would be a spike, after the detector learned from it
+    corrected = AgurDataPoint.from_values(date=data_points[-1].date, value=data_points[-1].value + 1000.0)
+    analytics.update(AgurDataSeries([*data_points[:-1], corrected]), [corrected], [], None)
+
+    assert analytics.last_value == corrected.value
+    assert analytics.anomalies == []
+    assert (analytics.detector.count, analytics.detector.mean) == (count, mean)
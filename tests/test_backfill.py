@@ -0,0 +1,130 @@
+"""Tests for the import of the whole history of statistics in the background, against the fake Agur API."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pytest_homeassistant_custom_component.components.recorder.common import async_wait_recording_done
+
+from homeassistant.components.recorder import Recorder, get_instance
+from homeassistant.components.recorder.statistics import statistics_during_period
+from homeassistant.core import HomeAssistant
+
+from custom_components.agur import statistics
+from custom_components.agur.statistics import build_statistics, statistic_id_for, statistic_start
+
+from . import get_coordinator, setup_integration
+
+CHUNK_SIZE = 100
+
+
+async def recorded_statistics(hass: HomeAssistant, statistic_id: str) -> list[dict]:
+    await async_wait_recording_done(hass)
+    rows = await get_instance(hass).async_add_executor_job(
+        statistics_during_period,
+        hass,
+        datetime(2000, 1, 1, tzinfo=timezone.utc),
+        None,
+        {statistic_id},
+        "hour",
+        None,
+        {"state", "sum"}
+    )
+    return rows.get(statistic_id, [])
+
+
+async def test_import_in_chunks(
+        recorder_mock: Recorder,
+        hass: HomeAssistant,
+        fake_agur,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(statistics, "BACKFILL_CHUNK_SIZE", CHUNK_SIZE)
+    monkeypatch.setattr(statistics, "BACKFILL_CHUNK_DELAY", 0)
+    api = await fake_agur(contracts=1, readings=365)
+    contract_id = api.contract_ids[0]
+    statistic_id = statistic_id_for(contract_id)
+    chunks: list[list] = []
+    async_add_external_statistics = statistics.async_add_external_statistics
+
+    def add_statistics(hass_: HomeAssistant, metadata, rows) -> None:
+        chunks.append(rows)
+        async_add_external_statistics(hass_, metadata, rows)
+
+    monkeypatch.setattr(statistics, "async_add_external_statistics", add_statistics)
+
+    config_entry = await setup_integration(hass, api.contract_ids)
+    coordinator = get_coordinator(hass, config_entry)
+    await coordinator.backfill._task
+    series = coordinator.data[contract_id].data_points
+
+    assert [len(chunk) for chunk in chunks] == [100, 100, 100, 65]
+    assert coordinator.backfill.is_complete(statistic_id)
+    assert coordinator.backfill.progress[statistic_id] == (365, 365)
+    # The sum is carried from one chunk to the next
+    rows = await recorded_statistics(hass, statistic_id)
+    assert [row["sum"] for row in rows] == pytest.approx([statistic["sum"] for statistic in build_statistics(series)])
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+
+async def test_resume_after_interruption(
+        recorder_mock: Recorder,
+        hass: HomeAssistant,
+        fake_agur,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(statistics, "BACKFILL_CHUNK_SIZE", CHUNK_SIZE)
+    monkeypatch.setattr(statistics, "BACKFILL_CHUNK_DELAY", 0)
+    api = await fake_agur(contracts=1, readings=365)
+    contract_id = api.contract_ids[0]
+    statistic_id = statistic_id_for(contract_id)
+    chunks: list[list] = []
+    resumed = False
+    async_add_external_statistics = statistics.async_add_external_statistics
+
+    def add_statistics(hass_: HomeAssistant, metadata, rows) -> None:
+        chunks.append(rows)
+        if len(chunks) == 2 and not resumed:
+            # Hold the import after the second chunk, until it is interrupted
+            monkeypatch.setattr(statistics, "BACKFILL_CHUNK_DELAY", 3600)
+        async_add_external_statistics(hass_, metadata, rows)
+
+    monkeypatch.setattr(statistics, "async_add_external_statistics", add_statistics)
+
+    config_entry = await setup_integration(hass, api.contract_ids)
+    coordinator = get_coordinator(hass, config_entry)
+    while coordinator.backfill.progress.get(statistic_id, (0, 0))[0] < 2 * CHUNK_SIZE:
+        await asyncio.sleep(0)
+    await async_wait_recording_done(hass)
+
+    # A reading is published during the import, and appended to the series being imported
+    api.add_reading(contract_id)
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert len(coordinator.data[contract_id].data_points) == 366
+    assert not coordinator.backfill.is_complete(statistic_id)
+
+    # e.g. Home Assistant is restarted
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert len(await recorded_statistics(hass, statistic_id)) == 2 * CHUNK_SIZE
+
+    monkeypatch.setattr(statistics, "BACKFILL_CHUNK_DELAY", 0)
+    resumed = True
+    chunks.clear()
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = get_coordinator(hass, config_entry)
+    await coordinator.backfill._task
+    series = coordinator.data[contract_id].data_points
+
+    # The last chunk submitted before the interruption is submitted again, in case it was not committed
+    assert chunks[0][0]["start"] == statistic_start(series, CHUNK_SIZE)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 66]
+    assert coordinator.backfill.is_complete(statistic_id)
+    rows = await recorded_statistics(hass, statistic_id)
+    assert [row["sum"] for row in rows] == pytest.approx([statistic["sum"] for statistic in build_statistics(series)])
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
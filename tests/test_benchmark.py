@@ -0,0 +1,390 @@
+"""
+Benchmarks of the Agur integration, only run with `pytest --benchmark`. A table of the results of each benchmark is
+printed at the end of the run.
+
+`test_refresh` benchmarks the refreshes of an Agur account against the fake Agur API, from 1 to 500 contracts:
+
+- the time of the first refresh, including the import of the whole history of the statistics, and the time the
+  recorder then takes to commit the statistics. The first refresh runs with memory tracing, which slows it down several
+  times, so its time is only comparable with the one of other runs of the benchmark;
+- the percentiles of the time of the refreshes without any change, and with a new reading for every contract;
+- the number of HTTP calls, executor jobs and recorder rows of the first refresh, and then per refresh;
+- the peak memory allocated during the first refresh.
+
+`test_client` compares the fetch of every endpoint of every contract, from the fake Agur API, by the async client
+sharing the pooled session of Home Assistant with the one of the sync client it replaced. The sync client opens a
+connection for every request, and the coordinator ran each of them in the executor, one contract after the other.
+
+`test_parsers` compares the decoding of large payloads of the fake Agur API into the models, and the parsing of dates and
+French decimals, with the code of the sync client. Each is timed as the best of a few runs, so the cache of the dates
+is warm like on every refresh after the first one.
+
+`test_statistics` times the statistics built from multi-year histories of daily readings: the whole history, as on
+the first import, and the reimport window of a refresh, either scanning the whole history as before or carrying on from
+the recorded sum before the window.
+
+`test_series_memory` compares the memory taken by the readings of an account kept as series, with the one they took as
+lists of reading objects.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import tracemalloc
+from collections.abc import Callable, Iterator
+from datetime import datetime
+from statistics import quantiles
+from time import perf_counter
+from timeit import repeat
+from typing import Any
+
+import pytest
+from pytest_homeassistant_custom_component.components.recorder.common import async_wait_recording_done
+
+from homeassistant.components.recorder import Recorder
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from custom_components.agur import agur_client, coordinator, statistics
+from custom_components.agur.agur_client import AgurClient, AgurContract, AgurDataPoint, AgurInvoice, \
+    REQUESTS_PER_CONTRACT, json_loads, parse_date, parse_french_decimal
+from custom_components.agur.const import DEFAULT_MAX_CONCURRENT_CONTRACTS
+from custom_components.agur.series import AgurDataSeries, year_start
+
+from . import USERNAME, get_coordinator, legacy_agur_client, recorded_rows, setup_integration
+from .fake_agur import FakeAgurApi
+
+# Latency of each response of the fake Agur API, in seconds, and the share of requests failing with a `503`
+LATENCY = 0.02
+ERROR_RATE = 0.01
+# Number of refreshes timed for each scenario after the first one
+REFRESHES = 10
+# Number of contracts, and of daily readings of each of them, of the memory benchmark of the series
+SERIES_CONTRACTS = 100
+SERIES_READINGS = 10 * 365
+# Number of runs of each parser, of which the fastest is kept
+PARSER_RUNS = 3
+
+
+@pytest.fixture
+def quiet_recorder() -> Iterator[None]:
+    """Stop logging every SQL statement of the recorder, which the test harness enables and which takes most of the time."""
+    logger = logging.getLogger("sqlalchemy.engine")
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    yield
+    logger.setLevel(level)
+
+
+def _count_calls(monkeypatch: pytest.MonkeyPatch, target: Any, name: str, count: Callable[..., int]) -> list[int]:
+    """Count the calls to `target.name`, each adding `count` of its arguments, in the returned one-item list."""
+    counter = [0]
+    original = getattr(target, name)
+
+    def wrapper(*args, **kwargs):
+        counter[0] += count(*args, **kwargs)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(target, name, wrapper)
+    return counter
+
+
+async def _fetch_with_sync_client(hass: HomeAssistant, contract_ids: list[str]) -> None:
+    """Fetch the contracts like the coordinator did with the sync client, in the executor."""
+    client = legacy_agur_client.AgurClient()
+    session_token = (await hass.async_add_executor_job(client.init))["token"]
+    client = legacy_agur_client.AgurClient(session_token=session_token)
+    auth_token = (await hass.async_add_executor_job(client.login, USERNAME, "secret"))["tokenAuthentique"]
+    for contract_id in contract_ids:
+        client = legacy_agur_client.AgurClient(session_token=session_token, auth_token=auth_token)
+        await asyncio.gather(*(
+            hass.async_add_executor_job(fetch, contract_id)
+            for fetch in (client.get_data, client.get_invoices, client.get_contract, client.get_balance)
+        ))
+
+
+async def _fetch_with_async_client(hass: HomeAssistant, contract_ids: list[str]) -> None:
+    """Fetch the contracts like the coordinator does with the async client, a few contracts at a time."""
+    client = agur_client.AgurClient(
+        session=async_get_clientsession(hass),
+        max_concurrent_requests=DEFAULT_MAX_CONCURRENT_CONTRACTS * REQUESTS_PER_CONTRACT
+    )
+    client.session_token = (await client.init())["token"]
+    client.auth_token = (await client.login(USERNAME, "secret"))["tokenAuthentique"]
+    semaphore = asyncio.Semaphore(DEFAULT_MAX_CONCURRENT_CONTRACTS)
+
+    async def fetch(contract_id: str) -> None:
+        async with semaphore:
+            await asyncio.gather(
+                client.get_data(contract_id),
+                client.get_invoices(contract_id),
+                client.get_contract(contract_id),
+                client.get_balance(contract_id),
+            )
+
+    await asyncio.gather(*(fetch(contract_id) for contract_id in contract_ids))
+
+
+def _parsers() -> list[tuple[str, int, Callable[[], Any], Callable[[], Any]]]:
+    """Return the name, number of items, and the sync client and current versions of each parser benchmarked."""
+    contracts_api = FakeAgurApi(contracts=10_000, readings=1, invoices=0)
+    contracts = json.dumps({
+        "resultats": [contracts_api.contract_json(contract_id) for contract_id in contracts_api.contract_ids]
+    }).encode()
+    api = FakeAgurApi(contracts=100, readings=10 * 365, invoices=120)
+    readings = [json.dumps({"resultats": api.readings_json(contract_id)}).encode() for contract_id in api.contract_ids]
+    invoices = [json.dumps({"resultats": api.invoices[contract_id]}).encode() for contract_id in api.contract_ids]
+    dates = [date.isoformat() for contract_readings in api.readings.values() for date, _ in contract_readings]
+    balances = [f"{index * 12.34:,.2f}".translate(str.maketrans(",.", ".,")) for index in range(100_000)]
+
+    return [
+        (
+            "AgurContract",
+            10_000,
+            lambda: [legacy_agur_client.AgurContract(json=item) for item in json.loads(contracts)["resultats"]],
+            lambda: [AgurContract(item) for item in json_loads(contracts)["resultats"]],
+        ),
+        (
+            "AgurDataPoint",
+            len(dates),
+            lambda: [
+                list(map(lambda item: legacy_agur_client.AgurDataPoint(json=item), json.loads(body)["resultats"]))
+                for body in readings
+            ],
+            lambda: [AgurClient._parse_data_points(json_loads(body)["resultats"], since=None) for body in readings],
+        ),
+        (
+            "AgurInvoice",
+            120 * len(invoices),
+            lambda: [
+                list(map(lambda item: legacy_agur_client.AgurInvoice(json=item), json.loads(body)["resultats"]))
+                for body in invoices
+            ],
+            lambda: [[AgurInvoice(item) for item in json_loads(body)["resultats"]] for body in invoices],
+        ),
+        (
+            "parse_date",
+            len(dates),
+            lambda: [datetime.fromisoformat(date) for date in dates],
+            lambda: [parse_date(date) for date in dates],
+        ),
+        (
+            "parse_french_decimal",
+            len(balances),
+            lambda: [float(balance.replace(".", "").replace(",", ".")) for balance in balances],
+            lambda: [parse_french_decimal(balance) for balance in balances],
+        ),
+    ]
+
+
+def _retained_memory(build: Callable[[], Any]) -> tuple[Any, int, float]:
+    """Return what `build` returns, along with the memory it still holds once built and the time it took."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    start = perf_counter()
+    built = build()
+    elapsed = perf_counter() - start
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, after - before, elapsed
+
+
+def _percentiles(samples: list[float]) -> str:
+    p50, p95 = (quantiles(samples, n=100, method="inclusive")[index] for index in (49, 94))
+    return f"{p50 * 1000:.0f}/{p95 * 1000:.0f}"
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("contracts", [1, 10, 100, 500])
+async def test_refresh(
+        quiet_recorder: None,
+        recorder_mock: Recorder,
+        hass: HomeAssistant,
+        fake_agur,
+        monkeypatch: pytest.MonkeyPatch,
+        benchmark_results: list[dict[str, Any]],
+        contracts: int
+) -> None:
+    monkeypatch.setattr(statistics, "BACKFILL_CHUNK_DELAY", 0)
+    monkeypatch.setattr(agur_client, "RETRY_BASE_DELAY", 0.01)
+    api = await fake_agur(contracts=contracts, latency=LATENCY, error_rate=ERROR_RATE)
+
+    executor_jobs = _count_calls(monkeypatch, hass, "async_add_executor_job", lambda *args, **kwargs: 1)
+    recorder_jobs = _count_calls(monkeypatch, recorder_mock, "async_add_executor_job", lambda *args, **kwargs: 1)
+    recorder_rows = [
+        _count_calls(monkeypatch, module, "async_add_external_statistics", lambda hass_, metadata, rows: len(rows))
+        for module in (coordinator, statistics)
+    ]
+
+    def counts() -> tuple[int, int, int]:
+        return (
+            api.total_calls,
+            executor_jobs[0] + recorder_jobs[0],
+            sum(counter[0] for counter in recorder_rows),
+        )
+
+    tracemalloc.start()
+    start = perf_counter()
+    config_entry = await setup_integration(hass, api.contract_ids)
+    agur_coordinator = get_coordinator(hass, config_entry)
+    if agur_coordinator.backfill._task is not None:
+        await agur_coordinator.backfill._task
+    first_refresh = perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(agur_coordinator.data) == contracts
+
+    start = perf_counter()
+    await async_wait_recording_done(hass)
+    recorder_commit = perf_counter() - start
+
+    first_counts = counts()
+    unchanged: list[float] = []
+    new_reading: list[float] = []
+    for samples, new_readings in ((unchanged, False), (new_reading, True)):
+        for _ in range(REFRESHES):
+            if new_readings:
+                for contract_id in api.contract_ids:
+                    api.add_reading(contract_id)
+            start = perf_counter()
+            await agur_coordinator.async_refresh()
+            samples.append(perf_counter() - start)
+            await async_wait_recording_done(hass)
+            assert agur_coordinator.last_update_success
+    per_refresh = [
+        round((total - first) / (2 * REFRESHES), 1) for total, first in zip(counts(), first_counts)
+    ]
+
+    benchmark_results.append({
+        "contracts": contracts,
+        "first refresh (s)": f"{first_refresh:.1f}",
+        "recorder commit (s)": f"{recorder_commit:.1f}",
+        "unchanged p50/p95 (ms)": _percentiles(unchanged),
+        "new reading p50/p95 (ms)": _percentiles(new_reading),
+        "HTTP calls": f"{first_counts[0]} / {per_refresh[0]}",
+        "executor jobs": f"{first_counts[1]} / {per_refresh[1]}",
+        "recorder rows": f"{first_counts[2]} / {per_refresh[2]}",
+        "peak memory (MB)": f"{peak_memory / 2 ** 20:.1f}",
+    })
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("contracts", [1, 10, 100])
+async def test_client(
+        recorder_mock: Recorder,
+        hass: HomeAssistant,
+        fake_agur,
+        monkeypatch: pytest.MonkeyPatch,
+        benchmark_results: list[dict[str, Any]],
+        contracts: int
+) -> None:
+    api = await fake_agur(contracts=contracts, readings=365, latency=LATENCY)
+    monkeypatch.setattr(legacy_agur_client, "API_BASE_URL", api.base_url)
+    executor_jobs = _count_calls(monkeypatch, hass, "async_add_executor_job", lambda *args, **kwargs: 1)
+
+    for path, fetch in (("sync client", _fetch_with_sync_client), ("async client", _fetch_with_async_client)):
+        api.calls.clear()
+        api.connections.clear()
+        executor_jobs[0] = 0
+        start = perf_counter()
+        await fetch(hass, api.contract_ids)
+        elapsed = perf_counter() - start
+
+        benchmark_results.append({
+            "client": path,
+            "contracts": contracts,
+            "time (s)": f"{elapsed:.2f}",
+            "HTTP calls": api.total_calls,
+            "connections": len(api.connections),
+            "executor jobs": executor_jobs[0],
+        })
+        assert api.total_calls == 2 + REQUESTS_PER_CONTRACT * contracts
+
+
+@pytest.mark.benchmark
+def test_parsers(benchmark_results: list[dict[str, Any]]) -> None:
+    for name, items, legacy_parse, parse in _parsers():
+        assert len(legacy_parse()) == len(parse())
+        legacy_time = min(repeat(legacy_parse, number=1, repeat=PARSER_RUNS))
+        parse_time = min(repeat(parse, number=1, repeat=PARSER_RUNS))
+        benchmark_results.append({
+            "parser": name,
+            "items": items,
+            "sync client (ms)": f"{legacy_time * 1000:.0f}",
+            "current (ms)": f"{parse_time * 1000:.0f}",
+            "speedup": f"{legacy_time / parse_time:.1f}x",
+        })
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("years", [1, 5, 10, 20])
+def test_statistics(benchmark_results: list[dict[str, Any]], years: int) -> None:
+    api = FakeAgurApi(readings=years * 365, invoices=0)
+    readings = api.readings[api.contract_ids[0]]
+    series = AgurDataSeries(AgurDataPoint.from_values(date=date, value=value) for date, value in reversed(readings))
+    min_start = series.latest_date - statistics.STATISTICS_REIMPORT_WINDOW
+    since = series.latest_date
+    # The rows the coordinator reads from the recorder
+    rows = [
+        row for row in recorded_rows(statistics.build_statistics(series))
+        if row["start"] >= statistics.reimport_start(series).timestamp()
+    ]
+    rollup_rows = [
+        row for row in recorded_rows(statistics.build_rollup_statistics(series, year_start))
+        if row["start"] >= statistics.rollup_reimport_start(series, year_start, since).timestamp()
+    ]
+
+    def best(build: Callable[[], Any]) -> str:
+        return f"{min(repeat(build, number=1, repeat=PARSER_RUNS)) * 1000:.2f}"
+
+    benchmark_results.append({
+        "years": years,
+        "readings": len(series),
+        "whole history (ms)": best(lambda: statistics.build_statistics(series)),
+        "window, scanning (ms)": best(lambda: statistics.build_statistics(series, min_start)),
+        "window, carried (ms)": best(lambda: statistics.build_statistics(series, min_start, rows)),
+        "yearly rollup, scanning (ms)": best(lambda: statistics.build_rollup_statistics(series, year_start, since)),
+        "yearly rollup, carried (ms)": best(
+            lambda: statistics.build_rollup_statistics(series, year_start, since, rollup_rows)
+        ),
+    })
+
+
+@pytest.mark.benchmark
+def test_series_memory(benchmark_results: list[dict[str, Any]]) -> None:
+    api = FakeAgurApi(contracts=SERIES_CONTRACTS, readings=SERIES_READINGS)
+    # The readings as the API returns them, from date descending
+    results = {
+        contract_id: [{"dateReleve": date.isoformat(), "valeurIndex": value} for date, value in readings]
+        for contract_id, readings in api.readings.items()
+    }
+
+    lists, lists_memory, lists_time = _retained_memory(lambda: {
+        contract_id: [legacy_agur_client.AgurDataPoint(json=json) for json in readings]
+        for contract_id, readings in results.items()
+    })
+    series, series_memory, series_time = _retained_memory(lambda: {
+        contract_id: AgurDataSeries(AgurDataPoint(json) for json in reversed(readings))
+        for contract_id, readings in results.items()
+    })
+    assert [data_point.value for data_point in reversed(lists[api.contract_ids[0]])] == list(
+        series[api.contract_ids[0]].values
+    )
+
+    readings = SERIES_CONTRACTS * SERIES_READINGS
+    for structure, memory, elapsed in (
+            ("list of readings", lists_memory, lists_time),
+            ("series", series_memory, series_time),
+    ):
+        benchmark_results.append({
+            "structure": structure,
+            "readings": readings,
+            "memory (MB)": f"{memory / 2 ** 20:.1f}",
+            "bytes per reading": f"{memory / readings:.0f}",
+            "build (s)": f"{elapsed:.2f}",
+        })
+    assert series_memory < lists_memory / 4
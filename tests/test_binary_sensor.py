@@ -0,0 +1,45 @@
+"""Tests for the binary sensor of an unusual consumption, against the fake Agur API."""
+from pytest_homeassistant_custom_component.common import async_capture_events
+
+from homeassistant.components.recorder import Recorder
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant
+
+from custom_components.agur.anomaly import ANOMALY_SPIKE
+from custom_components.agur.const import EVENT_CONSUMPTION_ANOMALY
+
+from . import get_coordinator, setup_integration
+
+
+async def test_consumption_anomaly(recorder_mock: Recorder, hass: HomeAssistant, fake_agur) -> None:
+    api = await fake_agur(contracts=1, readings=60, noise=10)
+    config_entry = await setup_integration(hass, api.contract_ids, import_statistics=False)
+    coordinator = get_coordinator(hass, config_entry)
+    contract_id = api.contract_ids[0]
+    entity_id = f"binary_sensor.agur_consumption_anomaly_{contract_id}"
+    events = async_capture_events(hass, EVENT_CONSUMPTION_ANOMALY)
+
+    state = hass.states.get(entity_id)
+    assert state.state == STATE_OFF
+    assert state.attributes["anomaly_type"] is None
+    assert 90 < state.attributes["expected_daily_consumption"] < 110
+
+    api.add_reading(contract_id, consumption=1000.0)
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    state = hass.states.get(entity_id)
+    assert state.state == STATE_ON
+    assert state.attributes["anomaly_type"] == ANOMALY_SPIKE
+    assert state.attributes["score"] >= 3
+    assert [(event.data["contract_id"], event.data["type"]) for event in events] == [(contract_id, ANOMALY_SPIKE)]
+
+    api.add_reading(contract_id, consumption=100.0)
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert hass.states.get(entity_id).state == STATE_OFF
+    assert len(events) == 1
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
@@ -0,0 +1,126 @@
+"""Tests for the refreshes of an Agur account, against the fake Agur API."""
+from time import perf_counter
+
+import pytest
+
+from homeassistant.components.recorder import Recorder
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import Entity
+from homeassistant.util import slugify
+
+from . import USERNAME, get_coordinator, setup_integration
+
+
+async def test_unchanged_refresh_writes_no_state(
+        recorder_mock: Recorder,
+        hass: HomeAssistant,
+        fake_agur,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    api = await fake_agur(contracts=100, readings=60)
+    config_entry = await setup_integration(hass, api.contract_ids, import_statistics=False)
+    coordinator = get_coordinator(hass, config_entry)
+
+    written: list[str] = []
+    async_write_ha_state = Entity.async_write_ha_state
+
+    def count_write(entity: Entity) -> None:
+        written.append(entity.entity_id)
+        async_write_ha_state(entity)
+
+    monkeypatch.setattr(Entity, "async_write_ha_state", count_write)
+
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert coordinator.last_update_success
+    assert coordinator.changed_contract_ids == set()
+    # Only the diagnostic sensors of the account are written, as the timings of the refresh changed
+    assert [entity_id for entity_id in written if not entity_id.endswith(slugify(USERNAME))] == []
+
+    changed_contract_id = api.contract_ids[42]
+    api.add_reading(changed_contract_id)
+    written.clear()
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert coordinator.changed_contract_ids == {changed_contract_id}
+    contract_writes = [entity_id for entity_id in written if not entity_id.endswith(slugify(USERNAME))]
+    assert len(contract_writes) > 0
+    assert all(entity_id.endswith(changed_contract_id) for entity_id in contract_writes)
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+
+async def test_refresh_time_is_flat_with_the_number_of_contracts(
+        recorder_mock: Recorder,
+        hass: HomeAssistant,
+        fake_agur
+) -> None:
+    latency = 0.5
+    api = await fake_agur(contracts=50, readings=30, latency=latency)
+    # The debug mode of the event loop the test harness enables captures the stack of every task and callback, which
+    # takes longer than the integration itself
+    hass.loop.set_debug(False)
+
+    elapsed: dict[int, float] = {}
+    for contracts in (1, 10, 50):
+        contract_ids = api.contract_ids[:contracts]
+        config_entry = await setup_integration(
+            hass,
+            contract_ids,
+            import_statistics=False,
+            max_concurrent_contracts=contracts
+        )
+        coordinator = get_coordinator(hass, config_entry)
+        for contract_id in contract_ids:
+            api.add_reading(contract_id)
+
+        start = perf_counter()
+        await coordinator.async_refresh()
+        elapsed[contracts] = perf_counter() - start
+
+        assert coordinator.last_update_success
+        assert coordinator.changed_contract_ids == set(contract_ids)
+        assert await hass.config_entries.async_unload(config_entry.entry_id)
+        assert await hass.config_entries.async_remove(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+    # Only the readings are fetched, with a single request per contract. All the contracts are refreshed at once, and
+    # the client is sized to send all their requests at once, so 50 contracts take a single round trip like one.
+    assert elapsed[1] >= latency
+    assert elapsed[10] < 2 * elapsed[1]
+    assert elapsed[50] < 2 * elapsed[1]
+
+
+async def test_failed_contract_is_stale(recorder_mock: Recorder, hass: HomeAssistant, fake_agur) -> None:
+    api = await fake_agur(contracts=2, readings=30)
+    config_entry = await setup_integration(hass, api.contract_ids, import_statistics=False)
+    coordinator = get_coordinator(hass, config_entry)
+    failing_contract_id, other_contract_id = api.contract_ids
+    entity_ids = [
+        f"sensor.agur_last_index_{failing_contract_id}",
+        f"sensor.agur_short_average_{failing_contract_id}",
+        f"binary_sensor.agur_consumption_anomaly_{failing_contract_id}",
+    ]
+    assert [hass.states.get(entity_id).attributes["stale"] for entity_id in entity_ids] == [False, False, False]
+
+    api.unavailable_contract_ids.add(failing_contract_id)
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert coordinator.last_update_success
+    assert coordinator.data[failing_contract_id].stale
+    assert [hass.states.get(entity_id).attributes["stale"] for entity_id in entity_ids] == [True, True, True]
+    assert hass.states.get(f"sensor.agur_short_average_{other_contract_id}").attributes["stale"] is False
+
+    api.unavailable_contract_ids.clear()
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert not coordinator.data[failing_contract_id].stale
+    assert [hass.states.get(entity_id).attributes["stale"] for entity_id in entity_ids] == [False, False, False]
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
@@ -0,0 +1,62 @@
+"""Tests for the merge of fetched readings into the history of a contract."""
+from datetime import datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.agur.agur_client import AgurClient, AgurDataPoint
+from custom_components.agur.history import AgurHistory
+
+START = datetime(2024, 2, 27, 6, tzinfo=timezone.utc)
+
+
+def readings(*values: tuple[int, float]) -> list[AgurDataPoint]:
+    """Return the readings with the given day offsets from `START` and values, from date descending."""
+    return [AgurDataPoint.from_values(date=START + timedelta(days=day), value=value) for day, value in values]
+
+
+def as_pairs(data_points: list[AgurDataPoint]) -> list[tuple[datetime, float]]:
+    return [(data_point.date, data_point.value) for data_point in data_points]
+
+
+async def test_merge_meter_replacement_twice(hass: HomeAssistant) -> None:
+    history = AgurHistory(hass, "00000001")
+    # The removal and installation readings of the replaced meter share a date, the API returns the removal one last
+    fetched = readings((3, 5.0), (2, 3.0), (2, 110.0), (1, 100.0))
+
+    assert as_pairs(history.merge(fetched)) == as_pairs(fetched)
+    assert list(history.data_points.values) == [100.0, 110.0, 3.0, 5.0]
+    assert history.merge(readings((3, 5.0), (2, 3.0), (2, 110.0), (1, 100.0))) == []
+
+
+async def test_merge_new_and_corrected_readings(hass: HomeAssistant) -> None:
+    history = AgurHistory(hass, "00000001")
+    history.merge(readings((2, 120.0), (1, 110.0), (0, 100.0)))
+
+    assert as_pairs(history.merge(readings((3, 130.0), (2, 120.0), (1, 110.0)))) == as_pairs(readings((3, 130.0)))
+    # Everything from the corrected reading on is reported
+    assert as_pairs(history.merge(readings((3, 130.0), (2, 125.0), (1, 110.0)))) == as_pairs(
+        readings((3, 130.0), (2, 125.0))
+    )
+    assert list(history.data_points.values) == [100.0, 110.0, 125.0, 130.0]
+
+
+async def test_merge_removed_reading(hass: HomeAssistant) -> None:
+    history = AgurHistory(hass, "00000001")
+    history.merge(readings((2, 120.0), (1, 110.0), (0, 100.0)))
+
+    assert history.merge(readings((1, 110.0), (0, 100.0))) == []
+    assert list(history.data_points.values) == [100.0, 110.0]
+
+
+def test_parse_data_points_sorts_from_date_descending() -> None:
+    results = [
+        {"dateReleve": "2024-03-01T06:00:00+00:00", "valeurIndex": 110},
+        {"dateReleve": "2024-03-02T06:00:00+00:00", "valeurIndex": 120},
+        {"dateReleve": "2024-03-01T06:00:00+00:00", "valeurIndex": 3},
+        {"dateReleve": "2024-02-01T06:00:00+00:00", "valeurIndex": 50},
+        {"dateReleve": None, "valeurIndex": 60},
+    ]
+
+    data_points = AgurClient._parse_data_points(results, since=datetime(2024, 2, 15, tzinfo=timezone.utc))
+
+    assert [(data_point.date.day, data_point.value) for data_point in data_points] == [(2, 120.0), (1, 110.0), (1, 3.0)]
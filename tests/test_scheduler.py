@@ -0,0 +1,45 @@
+"""Tests for the learning of the cadence of the readings and invoices of a contract."""
+from datetime import datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from custom_components.agur.agur_client import AgurDataPoint, AgurInvoice
+from custom_components.agur.scheduler import AgurContractCadence
+from custom_components.agur.series import AgurDataSeries
+
+START = datetime(2024, 3, 1, 6, tzinfo=timezone.utc)
+
+
+def daily_series(days: int) -> AgurDataSeries:
+    return AgurDataSeries(
+        AgurDataPoint.from_values(date=START + timedelta(days=day), value=100.0 * day) for day in range(days)
+    )
+
+
+def invoice(issue_date: str) -> AgurInvoice:
+    return AgurInvoice({"numeroFactureClient": issue_date, "dateEmissionFacture": issue_date})
+
+
+async def test_publication_delay_in_another_timezone(hass: HomeAssistant) -> None:
+    hass.config.set_time_zone("Europe/Paris")
+    cadence = AgurContractCadence()
+    cadence.update(daily_series(5), [], dt_util.as_local(START + timedelta(days=4, hours=1)))
+    assert cadence.publication_delay == timedelta()
+
+    # The new reading is published 2 hours after its date, while Paris is 1 hour ahead of UTC
+    cadence.update(daily_series(6), [], dt_util.as_local(START + timedelta(days=5, hours=2)))
+
+    assert cadence.reading_interval == timedelta(days=1)
+    assert cadence.publication_delay == timedelta(hours=2) * 0.3
+
+
+async def test_invoice_due_with_dates_without_timezone(hass: HomeAssistant) -> None:
+    hass.config.set_time_zone("Europe/Paris")
+    cadence = AgurContractCadence()
+    cadence.update(daily_series(2), [invoice("2024-01-15T00:00:00"), invoice("2024-02-15T00:00:00")], dt_util.now())
+
+    # The dates of the invoices are in the local time, i.e. midnight in Paris is 23:00 the day before in UTC
+    assert cadence.invoice_interval == timedelta(days=31)
+    assert not cadence.is_invoice_due(datetime(2024, 3, 16, 22, 59, tzinfo=timezone.utc))
+    assert cadence.is_invoice_due(datetime(2024, 3, 16, 23, tzinfo=timezone.utc))
@@ -0,0 +1,51 @@
+"""Tests for the compact time series of the index readings of a contract."""
+from datetime import datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.agur.agur_client import AgurDataPoint
+from custom_components.agur.series import AgurDataSeries, month_start
+
+PARIS_WINTER = timezone(timedelta(hours=1))
+PARIS_SUMMER = timezone(timedelta(hours=2))
+
+
+def make_series(*readings: tuple[datetime, float]) -> AgurDataSeries:
+    return AgurDataSeries(AgurDataPoint.from_values(date=date, value=value) for date, value in readings)
+
+
+async def test_dates_keep_the_offset_of_their_own_date(hass: HomeAssistant) -> None:
+    hass.config.set_time_zone("Europe/Paris")
+    # The first reading is before the change to summer time, the last one just after midnight on the 1st of July
+    series = make_series(
+        (datetime(2024, 3, 1, 0, 30, tzinfo=PARIS_WINTER), 100.0),
+        (datetime(2024, 6, 30, 12, tzinfo=PARIS_SUMMER), 150.0),
+        (datetime(2024, 7, 1, 0, 30, tzinfo=PARIS_SUMMER), 160.0),
+    )
+
+    assert series.latest_date.utcoffset() == timedelta(hours=2)
+    assert series.latest_date.replace(tzinfo=None) == datetime(2024, 7, 1, 0, 30)
+    assert [start.month for start, _, _ in series.aggregate(month_start)] == [3, 6, 7]
+
+
+async def test_daily_and_monthly_consumption(hass: HomeAssistant) -> None:
+    hass.config.set_time_zone("Europe/Paris")
+    start = datetime(2024, 1, 30, 6, tzinfo=PARIS_WINTER)
+    # The meter was reset on the 1st of February
+    series = make_series(*((start + timedelta(days=day), value) for day, value in enumerate([100, 110, 5, 20])))
+
+    assert [(date.day, consumption) for date, consumption in series.daily()] == [
+        (30, 0.0), (31, 10.0), (1, 0.0), (2, 15.0)
+    ]
+    assert [(date.month, consumption) for date, consumption in series.monthly()] == [(1, 10.0), (2, 15.0)]
+
+
+def test_rolling_average() -> None:
+    start = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+    series = make_series(*((start + timedelta(days=day), value) for day, value in enumerate([100, 110, 130, 0, 30])))
+
+    # The meter reset counts as no consumption
+    assert list(series.rolling_average(2)) == [15.0, 10.0, 15.0]
+    assert list(series.rolling_average(4)) == [15.0]
+    assert list(series.rolling_average(5)) == []
+    assert list(series.rolling_average(0)) == []
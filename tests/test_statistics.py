@@ -0,0 +1,127 @@
+"""Tests for the statistics built from the index readings of a contract."""
+import random
+from bisect import bisect_right
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.agur.agur_client import AgurDataPoint
+from custom_components.agur.series import AgurDataSeries, month_start, year_start
+from custom_components.agur.statistics import build_rollup_statistics, build_statistics, statistics_columns
+
+from . import recorded_rows
+
+START = datetime(2023, 1, 1, 8, tzinfo=timezone.utc)
+
+
+def make_series(values: list[float], step: timedelta = timedelta(days=1)) -> AgurDataSeries:
+    return AgurDataSeries(
+        AgurDataPoint.from_values(date=START + index * step, value=value) for index, value in enumerate(values)
+    )
+
+
+def random_series(seed: int) -> AgurDataSeries:
+    """
+    Return a random series of readings at irregular intervals, some sharing their date, with meter resets and
+    replacements by meters with a lower or higher index.
+    """
+    generator = random.Random(seed)
+    date = START
+    value = generator.uniform(0, 1000)
+    data_points = [AgurDataPoint.from_values(date=date, value=value)]
+    for _ in range(generator.randint(0, 300)):
+        date += timedelta(hours=generator.choice([0, 1, 6, 24, 24, 24, 72, 24 * 40]))
+        event = generator.random()
+        if event < 0.03:
+            value = 0.0
+        elif event < 0.06:
+            value = generator.uniform(0, 10000)
+        else:
+            value += generator.uniform(0, 200)
+        data_points.append(AgurDataPoint.from_values(date=date, value=value))
+    return AgurDataSeries(data_points)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_sums_never_decrease(seed: int) -> None:
+    series = random_series(seed)
+    consumptions, sums = statistics_columns(series)
+
+    assert sums[0] == series.values[0]
+    for index in range(1, len(series)):
+        delta = series.values[index] - series.values[index - 1]
+        # The consumption is the delta of the index, or none if the meter was reset or replaced
+        assert consumptions[index] == max(delta, 0.0)
+        assert sums[index] == pytest.approx(sums[index - 1] + consumptions[index])
+    assert [statistic["sum"] for statistic in build_statistics(series)] == list(sums)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_window_carries_on_from_the_recorded_sum(seed: int) -> None:
+    series = random_series(seed)
+    generator = random.Random(seed)
+    min_start = series.to_datetime(generator.uniform(series.timestamps[0] - 86400, series.timestamps[-1] + 86400))
+    statistics = build_statistics(series)
+
+    window = build_statistics(series, min_start, existing_rows=recorded_rows(statistics))
+
+    # The same statistics as the ones built from the whole series, for the readings after `min_start` only
+    expected = statistics[bisect_right(series.timestamps, min_start.timestamp()):]
+    assert [statistic["start"] for statistic in window] == [statistic["start"] for statistic in expected]
+    assert [statistic["state"] for statistic in window] == [statistic["state"] for statistic in expected]
+    assert [statistic["sum"] for statistic in window] == pytest.approx([statistic["sum"] for statistic in expected])
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("period_start", [month_start, year_start])
+def test_rollups_match_the_statistics(seed: int, period_start: Callable[[datetime], datetime]) -> None:
+    series = random_series(seed)
+    statistics = build_statistics(series)
+    rollups = build_rollup_statistics(series, period_start)
+
+    assert sum(rollup["state"] for rollup in rollups) == pytest.approx(sum(statistic["state"] for statistic in statistics))
+    # The sum of each period is the one of its last reading
+    last_sums = {period_start(statistic["start"]): statistic["sum"] for statistic in statistics}
+    assert {rollup["start"]: rollup["sum"] for rollup in rollups} == pytest.approx(last_sums)
+
+    since = series.to_datetime(random.Random(seed).choice(series.timestamps))
+    carried = build_rollup_statistics(series, period_start, since, existing_rows=recorded_rows(rollups))
+    assert [(rollup["start"], rollup["state"]) for rollup in carried] == [
+        (rollup["start"], rollup["state"]) for rollup in rollups if rollup["start"] >= period_start(since)
+    ]
+    assert [rollup["sum"] for rollup in carried] == pytest.approx(
+        [rollup["sum"] for rollup in rollups if rollup["start"] >= period_start(since)]
+    )
+
+
+def test_empty_series() -> None:
+    assert build_statistics(AgurDataSeries()) == []
+
+
+@pytest.mark.parametrize("min_start, first", [
+    (None, 0),
+    (START - timedelta(days=1), 0),
+    # Equal to the date of a reading, which is then excluded
+    (START, 1),
+    (START + timedelta(days=2), 3),
+    # Between two readings
+    (START + timedelta(days=2, hours=12), 3),
+    (START + timedelta(days=4), 5),
+    (START + timedelta(days=10), 5),
+])
+def test_min_start_boundary(min_start: datetime | None, first: int) -> None:
+    values = [100, 110, 125, 125, 140]
+    series = make_series(values)
+    _, sums = statistics_columns(series)
+
+    statistics = build_statistics(series, min_start)
+
+    assert [statistic["start"] for statistic in statistics] == [START + index * timedelta(days=1) for index in range(first, 5)]
+    assert [statistic["sum"] for statistic in statistics] == list(sums[first:])
+
+
+def test_start_is_truncated_to_the_hour() -> None:
+    series = AgurDataSeries([AgurDataPoint.from_values(date=START.replace(minute=42, second=7), value=100)])
+
+    assert build_statistics(series)[0]["start"] == START